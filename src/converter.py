@@ -1,5 +1,18 @@
+import argparse
+import hashlib
+import json
+import os
 import pdfplumber
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pdfminer.pdftypes import PDFObjRef, PDFStream, stream_value
+from pdfminer.psparser import PSLiteral
+
+# tables of the pages extracted before, by the hash of the page
+PAGE_CACHE_FILE = "./files/page_cache.json"
+# bump whenever the way pages are hashed or tables are extracted changes
+PAGE_CACHE_VERSION = 2
 
 
 def remove_headers(
@@ -40,18 +53,285 @@ def convert_timetable_to_csv(
     Returns:
         pd.DataFrame(): The timetable as a pandas dataframe.
     """
-    df = pd.DataFrame()
+    # the rows of all pages are collected first and the dataframe is built
+    # once, since concatenating a dataframe for every page is quadratic
+    rows: list[list[str]] = []
     for page in pages:
         table = page.extract_table()
         table = remove_headers(
             table,
             headers,
         )
-        df = pd.concat([df, pd.DataFrame(table)])
-    return df
+        rows.extend(table)
+    return pd.DataFrame(rows)
+
+
+def extract_page_tables(
+    page_numbers: list[int], file: str, headers: list[str]
+) -> list[list[list[str]]]:
+    """
+    Function to extract the tables of some pages of the pdf, in a worker process.
+    Each worker opens the pdf itself, so that only page numbers and tables are
+    sent between processes.
+
+    Args:
+        page_numbers (list[int]): The (1 indexed) numbers of the pages to extract the tables from.
+        file (str): The path to the pdf file.
+        headers (list[str]): The headers to remove from the tables.
+
+    Returns:
+        list[list[list[str]]]: The table of each page, with the headers removed.
+    """
+    tables: list[list[list[str]]] = []
+    with pdfplumber.open(file) as pdf:
+        for page_number in page_numbers:
+            table = pdf.pages[page_number - 1].extract_table()
+            tables.append(remove_headers(table, headers))
+    return tables
+
+
+def get_page_chunks(page_numbers: list[int], n_chunks: int) -> list[list[int]]:
+    """
+    Function to split the pages into contiguous ranges of about the same size,
+    keeping their order.
+
+    Args:
+        page_numbers (list[int]): The numbers of the pages to split.
+        n_chunks (int): The number of ranges to split the pages into.
+
+    Returns:
+        list[list[int]]: The ranges of pages, none of them empty.
+    """
+    n_chunks = max(1, min(n_chunks, len(page_numbers)))
+    size, extra = divmod(len(page_numbers), n_chunks)
+    chunks: list[list[int]] = []
+    start: int = 0
+    for i in range(n_chunks):
+        end = start + size + (i < extra)
+        chunks.append(page_numbers[start:end])
+        start = end
+    return chunks
+
+
+def extract_tables_parallel(
+    file: str, page_numbers: list[int], headers: list[str], workers: int = None
+) -> list[list[list[str]]]:
+    """
+    Function to extract the tables of the pages of the pdf in a pool of processes,
+    each extracting a contiguous range of the pages.
+
+    Args:
+        file (str): The path to the pdf file.
+        page_numbers (list[int]): The (1 indexed) numbers of the pages to extract the tables from.
+        headers (list[str]): The headers to remove from the tables.
+        workers (int, optional): The number of worker processes. Defaults to the number of cpus.
+
+    Returns:
+        list[list[list[str]]]: The table of each page (in the order of page_numbers),
+        with the headers removed.
+    """
+    if workers is None:
+        workers = os.cpu_count()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # map keeps the order of the ranges, so the tables stay in page order
+        chunk_tables = executor.map(
+            partial(extract_page_tables, file=file, headers=headers),
+            get_page_chunks(page_numbers, workers),
+        )
+        return [table for tables in chunk_tables for table in tables]
+
+
+def convert_timetable_to_csv_parallel(
+    file: str, page_numbers: list[int], headers: list[str], workers: int = None
+) -> pd.DataFrame():
+    """
+    Parallel version of convert_timetable_to_csv, which extracts ranges of pages
+    in a pool of processes. Gives the same dataframe.
+
+    Args:
+        file (str): The path to the pdf file.
+        page_numbers (list[int]): The (1 indexed) numbers of the pages to extract the timetable from.
+        headers (list[str]): The headers to remove from the table.
+        workers (int, optional): The number of worker processes. Defaults to the number of cpus.
+
+    Returns:
+        pd.DataFrame(): The timetable as a pandas dataframe.
+    """
+    tables = extract_tables_parallel(file, page_numbers, headers, workers)
+    return pd.DataFrame([row for table in tables for row in table])
+
+
+def update_hash_with_object(page_hash, obj, seen_objids: set) -> None:
+    """
+    Function to update a hash with a pdf object and everything it refers to,
+    i.e, the entries of dictionaries, the items of arrays and the data of streams.
+    Objects that were hashed already only add their object id, so cyclic
+    references end.
+
+    Args:
+        page_hash: The hash to update.
+        obj: The pdf object to hash.
+        seen_objids (set): The ids of the (indirect) objects hashed so far.
+    """
+    if isinstance(obj, PDFObjRef):
+        page_hash.update(repr(("ref", obj.objid)).encode())
+        if obj.objid in seen_objids:
+            return
+        seen_objids.add(obj.objid)
+        obj = obj.resolve()
+
+    if isinstance(obj, PDFStream):
+        page_hash.update(b"stream")
+        update_hash_with_object(page_hash, obj.attrs, seen_objids)
+        page_hash.update(obj.get_data())
+    elif isinstance(obj, dict):
+        page_hash.update(repr(("dict", len(obj))).encode())
+        for key in sorted(obj):
+            page_hash.update(repr(key).encode())
+            update_hash_with_object(page_hash, obj[key], seen_objids)
+    elif isinstance(obj, (list, tuple)):
+        page_hash.update(repr(("array", len(obj))).encode())
+        for item in obj:
+            update_hash_with_object(page_hash, item, seen_objids)
+    elif isinstance(obj, PSLiteral):
+        page_hash.update(repr(("name", obj.name)).encode())
+    else:
+        page_hash.update(repr(obj).encode())
+
+
+def get_page_hash(page: pdfplumber.page.Page, headers: list[str]) -> str:
+    """
+    Function to hash everything the table extracted from a page depends on, i.e,
+    the content streams of the page, its fonts and form xobjects (with everything
+    they refer to), its size and the headers removed.
+    This is a lot faster than extracting the table.
+
+    Args:
+        page (pdfplumber.page.Page): The page to hash.
+        headers (list[str]): The headers to remove from the table.
+
+    Returns:
+        str: The hex digest of the page.
+    """
+    page_hash = hashlib.sha256()
+    page_hash.update(json.dumps([PAGE_CACHE_VERSION, headers]).encode())
+    page_hash.update(repr((page.bbox, page.rotation)).encode())
+
+    page_obj = page.page_obj
+    for stream in page_obj.contents:
+        page_hash.update(stream_value(stream).get_data())
+
+    # text is decoded through the fonts (their encodings, widths, descendant
+    # fonts and ToUnicode maps), and xobjects draw content of their own, so a
+    # change in any of them changes the table
+    seen_objids = set()
+    for resource in ["Font", "XObject"]:
+        page_hash.update(resource.encode())
+        update_hash_with_object(
+            page_hash, page_obj.resources.get(resource, {}), seen_objids
+        )
+
+    return page_hash.hexdigest()
+
+
+def load_page_cache(cache_file: str) -> dict:
+    """
+    Function to load the tables extracted before, empty if there are none (or
+    they were extracted by an older version of the code).
+
+    Returns:
+        dict: hash of the page -> table of the page
+    """
+    try:
+        with open(cache_file, "r") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if cache.get("version") != PAGE_CACHE_VERSION:
+        return {}
+    return cache["tables"]
+
+
+def save_page_cache(cache_file: str, tables: dict) -> None:
+    """
+    Function to save the tables of the pages, by the hash of each page.
+    """
+    # written to a temporary file first, so the cache is never read half written
+    with open(cache_file + ".tmp", "w") as f:
+        json.dump({"version": PAGE_CACHE_VERSION, "tables": tables}, f)
+    os.replace(cache_file + ".tmp", cache_file)
+
+
+def convert_timetable_to_csv_incremental(
+    file: str,
+    page_numbers: list[int],
+    headers: list[str],
+    cache_file: str = PAGE_CACHE_FILE,
+    workers: int = 1,
+) -> pd.DataFrame():
+    """
+    Incremental version of convert_timetable_to_csv. The table of every page is
+    cached by the hash of the page, so when the pdf is republished only the pages
+    that changed are extracted again, and spliced in with the cached tables of
+    the rest. Gives the same dataframe.
+
+    Args:
+        file (str): The path to the pdf file.
+        page_numbers (list[int]): The (1 indexed) numbers of the pages to extract the timetable from.
+        headers (list[str]): The headers to remove from the table.
+        cache_file (str, optional): The path to the cache of tables. Defaults to PAGE_CACHE_FILE.
+        workers (int, optional): The number of worker processes to extract the
+          changed pages in. Defaults to 1.
+
+    Returns:
+        pd.DataFrame(): The timetable as a pandas dataframe.
+    """
+    with pdfplumber.open(file) as pdf:
+        page_hashes = [
+            get_page_hash(pdf.pages[page_number - 1], headers)
+            for page_number in page_numbers
+        ]
+
+    tables = load_page_cache(cache_file)
+    changed: dict[str, int] = {}
+    for page_number, page_hash in zip(page_numbers, page_hashes):
+        if page_hash not in tables:
+            changed.setdefault(page_hash, page_number)
+
+    if changed:
+        if workers > 1:
+            changed_tables = extract_tables_parallel(
+                file, list(changed.values()), headers, workers
+            )
+        else:
+            changed_tables = extract_page_tables(list(changed.values()), file, headers)
+        tables.update(zip(changed.keys(), changed_tables))
+
+    # only the pages of this pdf are kept, so the cache does not keep growing
+    tables = {page_hash: tables[page_hash] for page_hash in page_hashes}
+    save_page_cache(cache_file, tables)
+
+    return pd.DataFrame([row for page_hash in page_hashes for row in tables[page_hash]])
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="convert the timetable pdf to a csv file"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of processes to extract the pages in",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="extract every page again, instead of only the pages that changed",
+    )
+    args = parser.parse_args()
+
     # headers to remove from the table
     headers: list[str] = ["COM\nCOD"]
 
@@ -62,12 +342,23 @@ if __name__ == "__main__":
     # path to the pdf file
     file: str = r"./files/timetable.pdf"
 
-    pdf: pdfplumber.pdf.PDF = pdfplumber.open(file)
+    page_numbers: list[int] = list(range(page_range[0], page_range[1] + 1))
+
+    if not args.no_cache:
+        data: pd.DataFrame = convert_timetable_to_csv_incremental(
+            file, page_numbers, headers, workers=args.workers
+        )
+    elif args.workers > 1:
+        data: pd.DataFrame = convert_timetable_to_csv_parallel(
+            file, page_numbers, headers, args.workers
+        )
+    else:
+        pdf: pdfplumber.pdf.PDF = pdfplumber.open(file)
 
-    # might need to play around with the +-1, depending on how the pdf is formatted and how pdfplumber extracts the pages
-    pages: list[pdfplumber.page.Page] = pdf.pages[page_range[0] - 1 : page_range[1]]
+        # might need to play around with the +-1, depending on how the pdf is formatted and how pdfplumber extracts the pages
+        pages: list[pdfplumber.page.Page] = pdf.pages[page_range[0] - 1 : page_range[1]]
 
-    data: pd.DataFrame = convert_timetable_to_csv(pages, headers)
+        data: pd.DataFrame = convert_timetable_to_csv(pages, headers)
 
     # output the dataframe to csv
     data.to_csv("./files/output.csv", index=False)
@@ -0,0 +1,260 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+from typing import Optional
+from course_index import get_slots_mask
+from sort_heuristics import ExamSpread
+
+MAGIC = b"CHRONODB"
+# bump whenever the layout of the database changes
+DB_VERSION = 2
+
+# magic, version of the database, sha256 of the json file the database was
+# built from, number of courses, number of sections, size of the strings
+HEADER = struct.Struct("<8sI32sIII")
+# offset and length of the course code in the strings, first section and number
+# of sections of the course, (timestamp, day ordinal) of its midsem and compre
+# as computed by ExamSpread, a day ordinal of 0 meaning there is no such exam
+COURSE = struct.Struct("<IHIHqiqi")
+# offset and length of the section name in the strings, low and high 64 bits of
+# its slot mask, and whether it clashes with itself (i.e, it has no mask)
+SECTION = struct.Struct("<IHQQB")
+
+MASK_WORD = (1 << 64) - 1
+
+
+def get_db_path(json_file: str) -> str:
+    """
+    Function that returns the path of the course database of a timetable json file,
+    i.e, the same path with a .db extension
+    """
+    return os.path.splitext(json_file)[0] + ".db"
+
+
+def get_json_hash(json_file: str) -> bytes:
+    """
+    Function that returns the sha256 digest of the contents of a json file
+    """
+    with open(json_file, "rb") as f:
+        return hashlib.sha256(f.read()).digest()
+
+
+class CourseDB:
+    """The course database of a timetable json file, memory mapped.
+
+    It only holds what is compiled from the json (the slot masks of the sections
+    and the exam times of every course) in fixed width tables, with the courses
+    sorted by their code. A course is found by a binary search over the mapped
+    table, so only the courses that are looked up are ever read."""
+
+    def __init__(self, db_file: str):
+        """
+        Args:
+            db_file (str): path of the database, whose header is checked by load_course_db
+        """
+        with open(db_file, "rb") as f:
+            self.mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (
+            _,
+            _,
+            self.json_hash,
+            self.n_courses,
+            self.n_sections,
+            self.strings_size,
+        ) = HEADER.unpack_from(self.mapped, 0)
+        self.courses_offset = HEADER.size
+        self.sections_offset = self.courses_offset + self.n_courses * COURSE.size
+        self.strings_offset = self.sections_offset + self.n_sections * SECTION.size
+
+    def get_size(self) -> int:
+        """size the database should have, going by its header"""
+        return self.strings_offset + self.strings_size
+
+    def close(self) -> None:
+        self.mapped.close()
+
+    def _get_string(self, offset: int, length: int) -> bytes:
+        start = self.strings_offset + offset
+        return self.mapped[start : start + length]
+
+    def _find_course(self, course_code: str) -> Optional[tuple]:
+        code = course_code.encode()
+        low, high = 0, self.n_courses
+        while low < high:
+            middle = (low + high) // 2
+            course = COURSE.unpack_from(
+                self.mapped, self.courses_offset + middle * COURSE.size
+            )
+            middle_code = self._get_string(course[0], course[1])
+            if middle_code == code:
+                return course
+            if middle_code < code:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def get_compiled(self, course_code: str) -> Optional[tuple]:
+        """
+        compiled sections and exams of a course
+
+        Args:
+            course_code (str): BITS code of the course
+
+        Returns:
+            tuple: (section masks, exam times) of the course, as CompiledCourse
+              takes them, None if the course is not in the database
+        """
+        course = self._find_course(course_code)
+        if course is None:
+            return None
+        _, _, first_section, n_sections, *exams = course
+
+        section_masks = {}
+        for i in range(first_section, first_section + n_sections):
+            name_offset, name_length, low, high, clashes = SECTION.unpack_from(
+                self.mapped, self.sections_offset + i * SECTION.size
+            )
+            name = self._get_string(name_offset, name_length).decode()
+            section_masks[name] = None if clashes else low | high << 64
+
+        midsem_timestamp, midsem_day, compre_timestamp, compre_day = exams
+        exam_times = (
+            (midsem_timestamp, midsem_day) if midsem_day else None,
+            (compre_timestamp, compre_day) if compre_day else None,
+        )
+        return section_masks, exam_times
+
+
+def write_course_db(json_file: str, db_file: Optional[str] = None) -> None:
+    """
+    Function that builds the course database of a timetable json file
+
+    Args:
+        json_file (str): path of the timetable json file
+        db_file (str, optional): path of the database. Defaults to the json path with a .db extension.
+    """
+    if db_file is None:
+        db_file = get_db_path(json_file)
+
+    with open(json_file, "rb") as f:
+        contents = f.read()
+    courses = json.loads(contents)["courses"]
+
+    strings = bytearray()
+
+    def add_string(string: str) -> tuple[int, int]:
+        offset = len(strings)
+        strings.extend(string.encode())
+        return offset, len(strings) - offset
+
+    course_rows = []
+    section_rows = []
+    for course_code in sorted(courses, key=str.encode):
+        course = courses[course_code]
+        exams_iso = course["exams_iso"][0] if course["exams_iso"] else {}
+        exam_times = []
+        for exam in ["midsem", "compre"]:
+            exam_time = ExamSpread.parse_exam_time(exams_iso.get(exam, ""))
+            exam_times.extend(exam_time if exam_time is not None else (0, 0))
+
+        course_rows.append(
+            COURSE.pack(
+                *add_string(course_code),
+                len(section_rows),
+                len(course["sections"]),
+                *exam_times,
+            )
+        )
+        for sec, section in course["sections"].items():
+            mask = get_slots_mask(section["schedule"])
+            section_rows.append(
+                SECTION.pack(
+                    *add_string(sec),
+                    (mask or 0) & MASK_WORD,
+                    (mask or 0) >> 64,
+                    mask is None,
+                )
+            )
+
+    with open(db_file, "wb") as f:
+        f.write(
+            HEADER.pack(
+                MAGIC,
+                DB_VERSION,
+                hashlib.sha256(contents).digest(),
+                len(course_rows),
+                len(section_rows),
+                len(strings),
+            )
+        )
+        f.write(b"".join(course_rows))
+        f.write(b"".join(section_rows))
+        f.write(strings)
+
+
+def load_course_db(
+    json_file: str, db_file: Optional[str] = None, json_hash: Optional[bytes] = None
+) -> Optional[CourseDB]:
+    """
+    Function that memory maps the course database of a timetable json file. The
+    database is only used if it was built by this version of the code from the
+    current contents of the json file.
+
+    Args:
+        json_file (str): path of the timetable json file
+        db_file (str, optional): path of the database. Defaults to the json path with a .db extension.
+        json_hash (bytes, optional): sha256 digest of the json file, if already known
+
+    Returns:
+        CourseDB: the database, None if there is no database or it is out of date
+    """
+    if db_file is None:
+        db_file = get_db_path(json_file)
+
+    if not os.path.exists(db_file) or os.path.getsize(db_file) < HEADER.size:
+        return None
+    if json_hash is None:
+        json_hash = get_json_hash(json_file)
+
+    with open(db_file, "rb") as f:
+        magic, db_version, *_ = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or db_version != DB_VERSION:
+        return None
+
+    course_db = CourseDB(db_file)
+    if course_db.json_hash != json_hash or course_db.get_size() != len(
+        course_db.mapped
+    ):
+        course_db.close()
+        return None
+    return course_db
+
+
+def load_timetable_json(json_file: str) -> tuple[dict, Optional[CourseDB], bytes]:
+    """
+    Function that loads the timetable json along with its course database, if it
+    is up to date. The json file is only read (and hashed) once.
+
+    Args:
+        json_file (str): path of the timetable json file
+
+    Returns:
+        tuple: the timetable json, the course database (None if it is not used),
+          and the sha256 digest of the json file
+    """
+    with open(json_file, "rb") as f:
+        contents = f.read()
+    json_hash = hashlib.sha256(contents).digest()
+
+    return (
+        json.loads(contents),
+        load_course_db(json_file, json_hash=json_hash),
+        json_hash,
+    )
+
+
+if __name__ == "__main__":
+    write_course_db("./files/timetable.json")
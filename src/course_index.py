@@ -0,0 +1,290 @@
+from array import array
+from typing import Annotated, Iterable, Optional
+
+DAYS = ["M", "T", "W", "Th", "F", "S", "Su"]
+N_HOURS = 14  # hour numbers go from 1 (8-9AM) to 14 (9-10PM)
+
+# bit of each (day, hour) slot of the weekly grid, day major
+SLOT_BITS = {
+    (day, hour): 1 << (i * N_HOURS + hour - 1)
+    for i, day in enumerate(DAYS)
+    for hour in range(1, N_HOURS + 1)
+}
+
+
+def get_slots_mask(schedule: Annotated[list, "schedule of a section"]) -> Optional[int]:
+    """
+    Function that encodes all slots of a section's schedule into a bitmask over
+    the weekly slot grid
+
+    Args:
+        schedule (list): schedule of a section, as in the timetable json
+
+    Returns:
+        int: bitmask of the slots, None if a slot is used more than once
+    """
+    mask = 0
+    for sched in schedule:
+        for day in sched["days"]:
+            for hour in sched["hours"]:
+                bit = SLOT_BITS[(day, hour)]
+                if mask & bit:
+                    return None
+                mask |= bit
+    return mask
+
+
+class CompiledSection:
+    """A section of a course, compiled once from the filtered json."""
+
+    __slots__ = ("mask", "day_hours", "schedule")
+
+    def __init__(self, section_json, compiled_mask=None):
+        # None if the section clashes with itself, the mask compiled into the
+        # course database is used if given (get_slots_mask gives None again for
+        # a section which clashes with itself)
+        if compiled_mask is None:
+            compiled_mask = get_slots_mask(section_json["schedule"])
+        self.mask = compiled_mask
+        # hours of the section on each of its days, in the order of the schedule
+        self.day_hours = tuple(
+            (day, sched["hours"])
+            for sched in section_json["schedule"]
+            for day in sched["days"]
+        )
+        # schedule without the details that are not exported (rooms)
+        self.schedule = [
+            {"days": sched["days"], "hours": sched["hours"]}
+            for sched in section_json["schedule"]
+        ]
+
+
+class CompiledCourse:
+    """A course of the filtered json with its sections compiled, addressed by
+    a dense integer id."""
+
+    __slots__ = (
+        "id",
+        "code",
+        "sections",
+        "exams",
+        "exams_iso",
+        "exam_slots",
+        "exam_times",
+    )
+
+    def __init__(self, course_id, course_code, course_json, compiled=None):
+        """
+        Args:
+            course_id (int): id of the course
+            course_code (str): BITS code of the course
+            course_json (dict): the course in the filtered json
+            compiled (tuple, optional): (section masks, exam times) of the course
+              from the course database
+        """
+        section_masks, exam_times = compiled if compiled is not None else ({}, None)
+        self.id = course_id
+        self.code = course_code
+        self.sections = {
+            sec: CompiledSection(section, section_masks.get(sec))
+            for sec, section in course_json["sections"].items()
+        }
+        # exams as in the json, exported as they are
+        self.exams = course_json["exams"][0] if course_json["exams"] else {}
+        self.exams_iso = course_json["exams_iso"][0] if course_json["exams_iso"] else {}
+        # midsem and compre time of the course, a course without a midsem (or
+        # compre) has the empty string as its time, like in remove_exam_clashes
+        self.exam_slots = (self.exams.get("midsem", ""), self.exams.get("compre", ""))
+        # (midsem, compre) exam times as computed by ExamSpread, if they were
+        # compiled into the course database
+        self.exam_times = exam_times
+
+
+class CourseIndex:
+    """Compiled view of the filtered json, built once and shared by the
+    clash filters, the heuristics and the export.
+
+    All selected courses are in a single flat table, so a course is found with
+    one lookup instead of going through every class of courses, and clash checks
+    are a bitwise and of section masks."""
+
+    def __init__(self, json, course_db=None):
+        """
+        Args:
+            json (dict): filtered json file, i.e, with only courses selected
+            course_db (CourseDB, optional): course database (see
+              course_db.load_course_db), whose section masks and exam times are
+              used instead of compiling them again
+        """
+        # table of courses, the id of a course is its position in the table
+        self.courses = []
+        self.course_ids = {}
+        for course_class in ["CDCs", "DEls", "HUELs", "OPELs"]:
+            for course_code, course in json[course_class].items():
+                if course_code not in self.course_ids:
+                    compiled = None
+                    if course_db is not None:
+                        compiled = course_db.get_compiled(course_code)
+                    self.course_ids[course_code] = len(self.courses)
+                    self.courses.append(
+                        CompiledCourse(len(self.courses), course_code, course, compiled)
+                    )
+        self._choice_masks = {}
+        self._choice_day_counts = {}
+        # (course code, sections chosen) of every choice seen, by its dense id
+        self.choices = []
+        self.choice_ids = {}
+
+    def get_course(self, course_code: str) -> CompiledCourse:
+        try:
+            return self.courses[self.course_ids[course_code]]
+        except KeyError:
+            raise Exception("Course code not found in any category")
+
+    def get_section(self, course_code: str, section: str) -> CompiledSection:
+        return self.get_course(course_code).sections[section]
+
+    def choice_id(self, course_code: str, sections_chosen: tuple) -> int:
+        """
+        dense integer id of a course's choice of sections, given out the first
+        time the choice is seen
+
+        Args:
+            course_code (str): BITS code of the course
+            sections_chosen (tuple): sections chosen for the course
+
+        Returns:
+            int: id of the choice, its position in self.choices
+        """
+        key = (course_code, sections_chosen)
+        if key not in self.choice_ids:
+            self.choice_ids[key] = len(self.choices)
+            self.choices.append(key)
+        return self.choice_ids[key]
+
+    def choice_mask(self, course_code: str, sections_chosen: tuple) -> Optional[int]:
+        """
+        bitmask of all slots of a course's choice of sections
+
+        Args:
+            course_code (str): BITS code of the course
+            sections_chosen (tuple): sections chosen for the course
+
+        Returns:
+            int: bitmask of the slots, None if the sections clash among themselves
+        """
+        key = (course_code, sections_chosen)
+        if key not in self._choice_masks:
+            mask = 0
+            for sec in sections_chosen:
+                section_mask = self.get_section(course_code, sec).mask
+                if section_mask is None or mask & section_mask:
+                    mask = None
+                    break
+                mask |= section_mask
+            self._choice_masks[key] = mask
+        return self._choice_masks[key]
+
+    def choice_day_counts(self, course_code: str, sections_chosen: tuple) -> tuple:
+        """
+        number of classes of a course's choice of sections on each day, counted
+        like the entries of get_daywise_schedule
+
+        Args:
+            course_code (str): BITS code of the course
+            sections_chosen (tuple): sections chosen for the course
+
+        Returns:
+            tuple: number of classes on each day, in the order of DAYS
+        """
+        key = (course_code, sections_chosen)
+        if key not in self._choice_day_counts:
+            counts = [0] * len(DAYS)
+            for sec in sections_chosen:
+                for day, _ in self.get_section(course_code, sec).day_hours:
+                    counts[DAYS.index(day)] += 1
+            self._choice_day_counts[key] = tuple(counts)
+        return self._choice_day_counts[key]
+
+    def timetable_mask(self, timetable: Iterable[tuple]) -> Optional[int]:
+        """
+        occupancy of a timetable, i.e, the or of the masks of all its sections
+
+        Args:
+            timetable (Iterable[tuple]): (course code, sections chosen) of each course
+
+        Returns:
+            int: bitmask of the slots, None if the timetable has clashes
+        """
+        occupied = 0
+        for course_code, sections_chosen in timetable:
+            mask = self.choice_mask(course_code, sections_chosen)
+            if mask is None or occupied & mask:
+                return None
+            occupied |= mask
+        return occupied
+
+
+class TimetableStore:
+    """Timetables stored compactly, as the choice ids of their courses in one
+    flat array of fixed width rows, instead of as tuples of course codes and
+    sections. A stored timetable is referred to by its row number and is only
+    decoded back into a tuple when it is needed (e.g, to be exported). The
+    timetables of a TimetableSession are kept in one."""
+
+    def __init__(self, index: CourseIndex):
+        """
+        Args:
+            index (CourseIndex): compiled course index the choice ids come from
+        """
+        self.index = index
+        # shared with the index, which adds the choices as it gives out their ids
+        self.choices = index.choices
+        self.rows = array("I")
+        # number of courses of every timetable, set by the first one stored
+        self.width = None
+        self.n_rows = 0
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def __getstate__(self) -> dict:
+        # a pickled store only keeps what is needed to decode its timetables
+        return {
+            "choices": self.choices,
+            "rows": self.rows,
+            "width": self.width,
+            "n_rows": self.n_rows,
+        }
+
+    def __setstate__(self, state: dict) -> None:
+        self.index = None
+        self.__dict__.update(state)
+
+    def add(self, timetable: Iterable[tuple]) -> int:
+        """
+        stores a timetable
+
+        Args:
+            timetable (Iterable[tuple]): (course code, sections chosen) of each course
+
+        Returns:
+            int: row number of the stored timetable
+        """
+        ids = [self.index.choice_id(*choice) for choice in timetable]
+        if self.width is None:
+            self.width = len(ids)
+        elif len(ids) != self.width:
+            raise Exception(
+                "Timetables of a store must have the same number of courses"
+            )
+        self.rows.extend(ids)
+        self.n_rows += 1
+        return self.n_rows - 1
+
+    def __getitem__(self, row: int) -> tuple:
+        start = row * self.width
+        return tuple(
+            self.choices[choice_id]
+            for choice_id in self.rows[start : start + self.width]
+        )
@@ -1,6 +1,7 @@
 import pandas as pd
 import json
-from parse_times import parse_time, parse_compre_time
+from parse_times import parse_times, parse_compre_times
+from course_db import write_course_db
 
 
 def isnan(value):
@@ -60,6 +61,23 @@ def remove_duplicate_dicts(l: list[dict]) -> list[dict]:
     return new_l
 
 
+def append_if_not_duplicate(l: list[dict], seen: set, d: dict) -> None:
+    """
+    Function to append a dictionary to a list of dictionaries, unless an equal
+    dictionary was already appended. Appending every dictionary this way gives
+    the same list as remove_duplicate_dicts, without going over the list again.
+
+    Args:
+        l (list[dict]): The list of dictionaries to append to.
+        seen (set): The keys of the dictionaries already in the list.
+        d (dict): The dictionary to append.
+    """
+    t = tuple(sorted(d.items()))
+    if t not in seen:
+        seen.add(t)
+        l.append(d)
+
+
 def create_json_file(
     timetable: pd.DataFrame,
     columns: list[str],
@@ -87,7 +105,15 @@ def create_json_file(
     # Filling all empty rows with the previous row's value for simplicity
     tt.fillna(method="ffill", inplace=True)
 
-    for _, row in tt.iterrows():
+    # keys of the schedules of each section and the exams of each course seen
+    # so far, so duplicates are skipped as the rows are read
+    seen_schedules: dict = {}
+    seen_exams: dict = {}
+
+    # itertuples gives plain tuples, a lot faster than building a series per row
+    # like iterrows does
+    for values in tt.itertuples(index=False, name=None):
+        row = dict(zip(tt.columns, values))
         course_code = row["course_code"]
 
         # initialize course and course details if not already initialized
@@ -128,19 +154,15 @@ def create_json_file(
         # add schedule to the list of schedules for the section
         # list of schedules is a list of dictionaries, where each dictionary is a schedule
         # we kept it as a list, as a class may have multiple schedules (eg: "T Th @ 4" and "S @ 2")
-        course_json[course_code]["sections"][section]["schedule"].append(
+        # duplicate schedules are not added
+        append_if_not_duplicate(
+            course_json[course_code]["sections"][section]["schedule"],
+            seen_schedules.setdefault((course_code, section), set()),
             {
                 "room": row["room"],
                 "days": tuple(row["days"].split()),
                 "hours": tuple([int(x) for x in list(row["hours"].split())]),
-            }
-        )
-
-        # remove duplicate schedules
-        course_json[course_code]["sections"][section][
-            "schedule"
-        ] = remove_duplicate_dicts(
-            course_json[course_code]["sections"][section]["schedule"]
+            },
         )
 
         # initialize exams if not already initialized
@@ -155,15 +177,21 @@ def create_json_file(
         if not isnan(row["compre"]):
             exam_dict["compre"] = row["compre"]
 
+        # duplicate exams are not added
         if exam_dict:
-            course_json[course_code]["exams"].append(exam_dict)
-
-        # remove duplicate exams
-        course_json[course_code]["exams"] = remove_duplicate_dicts(
-            course_json[course_code]["exams"]
-        )
+            append_if_not_duplicate(
+                course_json[course_code]["exams"],
+                seen_exams.setdefault(course_code, set()),
+                exam_dict,
+            )
+
+    # parse exam times, the midsems and compres of all courses at once
+    exams = [exam for course in course_json.values() for exam in course["exams"]]
+    midsems = [exam["midsem"] for exam in exams if exam.get("midsem")]
+    compres = [exam["compre"] for exam in exams if exam.get("compre")]
+    midsems_iso = dict(zip(midsems, parse_times(midsems, year)))
+    compres_iso = dict(zip(compres, parse_compre_times(compres, year)))
 
-    # parse exam times
     for course_code in course_json:
         exams_list = course_json[course_code]["exams"]
         exams_iso = []
@@ -171,10 +199,10 @@ def create_json_file(
             exam_iso = {}
 
             if exam.get("midsem"):
-                exam_iso["midsem"] = parse_time(exam["midsem"], year)
+                exam_iso["midsem"] = midsems_iso[exam["midsem"]]
 
             if exam.get("compre"):
-                exam_iso["compre"] = parse_compre_time(exam["compre"], year)
+                exam_iso["compre"] = compres_iso[exam["compre"]]
 
             if exam_iso:
                 exams_iso.append(exam_iso)
@@ -190,7 +218,8 @@ def create_json_file(
     }
     final_json["courses"] = course_json
     # output the json file
-    json.dump(final_json, open(output_file, "w"), indent=4)
+    with open(output_file, "w") as f:
+        json.dump(final_json, f, indent=4)
 
 
 if __name__ == "__main__":
@@ -214,3 +243,6 @@ if __name__ == "__main__":
     timetable = pd.read_csv("./files/output.csv")
 
     create_json_file(timetable, columns, "./files/timetable.json", 2023, 2023, 1)
+
+    # compile the json into the course database the timetables script loads
+    write_course_db("./files/timetable.json")
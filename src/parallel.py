@@ -0,0 +1,218 @@
+import heapq
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice, product
+from typing import Annotated, Optional
+from course_index import CourseIndex
+from timetables import (
+    count_passing,
+    generate_course_domains,
+    get_sort_key,
+    get_sort_order_mask,
+    iter_decorated_timetables,
+    iter_remove_clashes,
+    iter_remove_exam_clashes,
+    reorder_daily_scores,
+)
+
+# state shared by all shards of a worker, set once by init_worker so that the
+# json and the course domains are not sent over again with every shard
+_worker_context = {}
+
+
+def init_worker(
+    sect_seperated_json: dict,
+    json: dict,
+    n_dels: int,
+    n_opels: int,
+    n_huels: int,
+    ranking_args: tuple,
+) -> None:
+    """
+    Function that sets up a worker process of the pool
+
+    Args:
+        sect_seperated_json (dict): filtered json with courses seperated into sections
+        json (dict): filtered json file, i.e, with only courses selected
+        n_dels (int): number of DELs selected
+        n_opels (int): number of OPELs selected
+        n_huels (int): number of HUELs selected
+        ranking_args (tuple): arguments of iter_decorated_timetables after json,
+          (free_days, lite_order, exam_fit_strategy, filter_exams_on_same_day, filter, strong)
+    """
+    _worker_context["json"] = json
+    _worker_context["index"] = CourseIndex(json)
+    _worker_context["course_domains"] = list(
+        generate_course_domains(sect_seperated_json, n_dels, n_opels, n_huels)
+    )
+    _worker_context["ranking_args"] = ranking_args
+
+
+def get_shards(course_domains: Annotated[list, "course domains of the run"]) -> list:
+    """
+    Function that splits the search space into shards, one for each choice of
+    the first course within each combination of electives. The shards are in the
+    order in which the serial generation goes through them.
+
+    Args:
+        course_domains (list): candidate choices of each course in the timetable
+          for every combination of electives, as yielded by generate_course_domains
+
+    Returns:
+        list: (index of the combination of electives, index of the choice of the first course)
+    """
+    shards = []
+    for i, courses in enumerate(course_domains):
+        if courses and all(courses):
+            shards.extend((i, choice) for choice in range(len(courses[0])))
+    return shards
+
+
+def rank_shard(shard: tuple, n_top: Optional[int]) -> tuple[int, int, list]:
+    """
+    Function that filters and ranks the timetables of one shard in a worker process
+
+    Args:
+        shard (tuple): (index of the combination of electives, index of the choice of the first course)
+        n_top (int, optional): number of best timetables of the shard to keep, all if None
+
+    Returns:
+        tuple: number of timetables without clashes (classes), number of timetables without
+          clashes (classes and exams), and the ranked timetables of the shard
+    """
+    json = _worker_context["json"]
+    index = _worker_context["index"]
+    (
+        free_days,
+        lite_order,
+        exam_fit_strategy,
+        filter_exams_on_same_day,
+        *_,
+    ) = _worker_context["ranking_args"]
+    combination, choice = shard
+    first_course, *other_courses = _worker_context["course_domains"][combination]
+
+    counts = {}
+    timetables = product([first_course[choice]], *other_courses)
+    timetables = count_passing(
+        iter_remove_clashes(timetables, json, index), counts, "classes"
+    )
+    timetables = count_passing(
+        iter_remove_exam_clashes(timetables, json, index), counts, "classes and exams"
+    )
+    decorated = iter_decorated_timetables(
+        timetables, json, *_worker_context["ranking_args"], index
+    )
+
+    sort_key = partial(
+        get_sort_key,
+        sort_order_mask=get_sort_order_mask(
+            exam_fit_strategy, filter_exams_on_same_day
+        ),
+    )
+    if n_top is None:
+        ranked = sorted(decorated, key=sort_key)
+    else:
+        ranked = heapq.nsmallest(n_top, decorated, key=sort_key)
+
+    return counts["classes"], counts["classes and exams"], ranked
+
+
+def sort_acc_to_heuristics_parallel(
+    sect_seperated_json: Annotated[
+        dict, "filtered json with courses seperated into sections"
+    ],
+    json: Annotated[dict, "filtered json file"],
+    n_dels: Annotated[int, "number of DELs selected"],
+    n_opels: Annotated[int, "number of OPELs selected"],
+    n_huels: Annotated[int, "number of HUELs selected"],
+    free_days: Annotated[list[str], "list of days to be free if possible"],
+    lite_order: Annotated[
+        list[str],
+        "increasing order of how lite you want days to be (earlier means more lite)",
+    ],
+    exam_fit_strategy: Optional[str] = None,
+    filter_exams_on_same_day=False,
+    filter: Annotated[bool, "whether to filter or to just sort"] = False,
+    strong: Annotated[bool, "whether to use strong filter or not"] = False,
+    workers: Annotated[Optional[int], "number of worker processes"] = None,
+    n_top: Annotated[Optional[int], "number of best timetables to return"] = None,
+    stage_counts: Optional[dict] = None,
+) -> list:
+    """
+    Function that generates, filters and sorts all timetables like the serial
+    pipeline does (see sort_acc_to_heuristics), but with the search space split
+    into shards that are handled by a pool of worker processes.
+
+    Every shard is ranked on its own and the ranked shards are merged in the
+    order of the serial generation, so the result is the same as the serial one,
+    including the order of timetables with equal heuristics.
+
+    Args:
+        sect_seperated_json (dict): filtered json with courses seperated into sections
+        json (dict): filtered json file, i.e, with only courses selected
+        n_dels (int): number of DELs selected
+        n_opels (int): number of OPELs selected
+        n_huels (int): number of HUELs selected
+        free_days (list): list of days to be free if possible
+        lite_order (list): increasing order of how lite you want days to be (earlier means more lite)
+        exam_fit_strategy (str, optional): the strategy to use to sort exam spread seconds
+        filter_exams_on_same_day (bool): whether to reduce rank of timetables which have exams on same day
+        filter (bool, optional): whether to filter or to just sort. Defaults to False.
+        strong (bool, optional): whether to use strong filter or not. Defaults to False.
+        workers (int, optional): number of worker processes. Defaults to the number of cpus.
+        n_top (int, optional): number of best timetables to return. Defaults to all of them.
+        stage_counts (dict, optional): if given, the number of timetables without
+          clashes is stored under "classes" and "classes and exams"
+
+    Returns:
+        list: list of timetables after sorting.
+    """
+    if workers is None:
+        workers = os.cpu_count()
+    # heapq.nsmallest(0, ...) never runs the pipeline, so nothing would be counted
+    if n_top is not None and n_top < 1:
+        raise Exception("n_top must be at least 1")
+
+    ranking_args = (
+        free_days,
+        lite_order,
+        exam_fit_strategy,
+        filter_exams_on_same_day,
+        filter,
+        strong,
+    )
+    shards = get_shards(
+        list(generate_course_domains(sect_seperated_json, n_dels, n_opels, n_huels))
+    )
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_worker,
+        initargs=(sect_seperated_json, json, n_dels, n_opels, n_huels, ranking_args),
+    ) as executor:
+        results = list(executor.map(partial(rank_shard, n_top=n_top), shards))
+
+    if stage_counts is not None:
+        stage_counts["classes"] = sum(n_class_free for n_class_free, _, _ in results)
+        stage_counts["classes and exams"] = sum(n_free for _, n_free, _ in results)
+
+    # heapq.merge breaks ties in favour of the earlier shard, which keeps the
+    # order of the serial (stable) sort
+    sort_key = partial(
+        get_sort_key,
+        sort_order_mask=get_sort_order_mask(
+            exam_fit_strategy, filter_exams_on_same_day
+        ),
+    )
+    result_list = list(
+        islice(
+            heapq.merge(*(ranked for _, _, ranked in results), key=sort_key),
+            n_top,
+        )
+    )
+
+    reorder_daily_scores(result_list, lite_order)
+
+    return result_list
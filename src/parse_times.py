@@ -1,4 +1,5 @@
 import pandas as pd
+from typing import Iterable
 
 
 def parse_time(time: str, year: int, midsem=True) -> str:
@@ -110,6 +111,46 @@ def parse_compre_time(compre_time: str, year: int):
     return parse_time(time, year, False)
 
 
+def parse_times(times: Iterable[str], year: int, midsem=True) -> list[str]:
+    """
+    Function to parse a whole column of times given by ttd. Each distinct time is
+    parsed once with parse_time, and the results are mapped back to the column.
+
+    Args:
+        times (Iterable[str]): The strings given by ttd for the times. (Format: "13/03 11.30 - 1.00PM")
+        year (int): The year of the timetable. (example: 2023)
+
+    Returns:
+        list[str]: The times in ISO format, in the same order. (example: "2023-03-13T11:30:00|2023-03-13T13:00:00")
+    """
+    times = list(times)
+    # only a few dozen distinct exam times are given by ttd, so each one is parsed once
+    parsed = {time: parse_time(time, year, midsem) for time in dict.fromkeys(times)}
+    return [parsed[time] for time in times]
+
+
+def parse_compre_times(compre_times: Iterable[str], year: int) -> list[str]:
+    """
+    Function to parse a whole column of compre times given by ttd. Each distinct
+    compre time is parsed once with parse_compre_time, and the results are mapped
+    back to the column.
+
+    Args:
+        compre_times (Iterable[str]): The strings given by ttd for the compre times. (Format: "19/05 FN")
+        year (int): The year of the timetable. (example: 2023)
+
+    Returns:
+        list[str]: The compre times in ISO format, in the same order. (example: "2023-05-19T09:30:00|2023-05-19T12:30:00")
+    """
+    compre_times = list(compre_times)
+    # only a few dozen distinct exam times are given by ttd, so each one is parsed once
+    parsed = {
+        compre_time: parse_compre_time(compre_time, year)
+        for compre_time in dict.fromkeys(compre_times)
+    }
+    return [parsed[compre_time] for compre_time in compre_times]
+
+
 if __name__ == "__main__":
     print(parse_time("14/10 - 4.00 - 5.30PM", 2023))
     print(parse_compre_time("21/12 AN", 2023))
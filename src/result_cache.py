@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import pickle
+from typing import Any, Optional
+
+CACHE_DIR = "./files/cache"
+# part of every key, bump whenever the format of what is cached changes so that
+# results cached by an older version are never read
+CACHE_VERSION = 3
+# total size of the cached results, the least recently used are removed past it
+MAX_CACHE_BYTES = 256 * 2**20
+
+
+def get_query_key(*query: Any) -> str:
+    """
+    Function that returns the key of a query, a hash of its canonical json form
+    (along with the version of the cache)
+
+    Args:
+        *query: inputs of the query, anything that can be converted to json
+          (tuples are the same as lists)
+
+    Returns:
+        str: hex digest of the query
+    """
+    canonical = json.dumps(
+        [CACHE_VERSION, *query], sort_keys=True, separators=(",", ":")
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ResultCache:
+    """On disk cache of results, one pickle file per key. Reading a result
+    marks it as recently used, and the least recently used results are removed
+    once the cache takes up more than its size limit."""
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = MAX_CACHE_BYTES):
+        """
+        Args:
+            cache_dir (str, optional): directory the results are kept in. Defaults to CACHE_DIR.
+            max_bytes (int, optional): size limit of the cache. Defaults to MAX_CACHE_BYTES.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ".pkl")
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        cached result of a key, None if it is not cached (or cannot be read)
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                result = pickle.load(f)
+        except Exception:
+            # unpickling can fail in many ways (e.g, a class that has since
+            # changed or moved), all of which just mean the result is not cached
+            return None
+        # the modification time is when the result was last used
+        os.utime(path)
+        return result
+
+    def put(self, key: str, result: Any) -> None:
+        """
+        caches the result of a key, then removes the least recently used
+        results if the cache is over its size limit
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        # written to a temporary file first, so a result is never read half written
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        removes the least recently used results until the cache is within its size limit
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".pkl"):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.cache_dir, name))
+            total -= size
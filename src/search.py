@@ -0,0 +1,1019 @@
+import bisect
+from collections import Counter, deque
+from typing import Annotated, Callable, Iterable, Iterator, Optional
+from course_index import DAYS, N_HOURS, SLOT_BITS, CourseIndex
+from sort_heuristics import ExamSpread
+from vectorized import iter_vectorized_timetables
+from timetables import (
+    generate_course_domains,
+    get_heuristics,
+    get_sort_key,
+    get_sort_order_mask,
+    iter_exhaustive_timetables,
+    iter_remove_clashes,
+    iter_remove_exam_clashes,
+    reorder_daily_scores,
+)
+
+
+def iter_bits(bitset: int) -> Iterator[int]:
+    """
+    Generator that yields the positions of the set bits of an integer,
+    lowest first
+
+    Args:
+        bitset (int): the integer whose set bits are wanted
+    """
+    while bitset:
+        low = bitset & -bitset
+        yield low.bit_length() - 1
+        bitset ^= low
+
+
+class CompatibilityTable:
+    """Pairwise compatibility of the section combinations of the selected
+    courses, computed once before any search starts.
+
+    For every ordered pair of courses (c1, c2), row a of the pair is a bitset
+    over the choices of c2 in which bit b is set if choice a of c1 and choice b
+    of c2 neither share a class slot nor an exam slot.
+    """
+
+    def __init__(self, course_domains, index):
+        """
+        Args:
+            course_domains (Iterable[list]): candidate choices of each course in
+              the timetable, as yielded by generate_course_domains
+            index (CourseIndex): compiled course index of the filtered json
+        """
+        # a course has the same candidate choices in every combination of electives
+        self.domains = {}
+        for courses in course_domains:
+            for domain in courses:
+                if domain:
+                    self.domains.setdefault(domain[0][0], domain)
+
+        masks = {
+            course_code: [index.choice_mask(*choice) for choice in domain]
+            for course_code, domain in self.domains.items()
+        }
+        exams = {
+            course_code: index.get_course(course_code).exam_slots
+            for course_code in self.domains
+        }
+
+        # bitset of the choices which do not clash with themselves
+        self.valid = {
+            course_code: sum(
+                1 << i for i, mask in enumerate(masks[course_code]) if mask is not None
+            )
+            for course_code in self.domains
+        }
+
+        self.compatible = {}
+        for c1 in self.domains:
+            for c2 in self.domains:
+                if c1 == c2:
+                    continue
+                (mid_1, compre_1), (mid_2, compre_2) = exams[c1], exams[c2]
+                if mid_1 == mid_2 or compre_1 == compre_2:
+                    # exams clash whichever sections are chosen
+                    self.compatible[(c1, c2)] = [0] * len(masks[c1])
+                    continue
+                rows = []
+                for mask_1 in masks[c1]:
+                    row = 0
+                    if mask_1 is not None:
+                        for i, mask_2 in enumerate(masks[c2]):
+                            if mask_2 is not None and not mask_1 & mask_2:
+                                row |= 1 << i
+                    rows.append(row)
+                self.compatible[(c1, c2)] = rows
+
+
+def backtrack_timetables(
+    courses: Annotated[list, "candidate choices of each course in the timetable"],
+    compatibility: CompatibilityTable,
+    domains: Annotated[Optional[list[int]], "choices left of each course"] = None,
+) -> Iterator[tuple]:
+    """
+    Generator that does a depth first search over the choices of each course,
+    assigning one course at a time. Every assignment narrows down the choices
+    left for the later courses to the ones compatible with it, and the branch is
+    pruned as soon as any later course has no choices left.
+
+    Timetables are yielded in the same order as filtering the cartesian product
+    of the choices would give them, as pruning only drops clashing prefixes.
+
+    Args:
+        courses (list): candidate (course code, section combination) choices of
+          each course, as yielded by generate_course_domains
+        compatibility (CompatibilityTable): compatibility of the choices of the courses
+        domains (list[int], optional): bitset of the choices of each course to search
+          over, defaults to every choice which does not clash with itself
+
+    Yields:
+        tuple: timetable without any clashes (classes and exams)
+    """
+    if not all(courses):
+        return
+
+    course_codes = [domain[0][0] for domain in courses]
+    if domains is None:
+        domains = [compatibility.valid[code] for code in course_codes]
+    n_courses = len(courses)
+    # rows of the compatibility table of each course with every later course
+    later_rows = [
+        [
+            compatibility.compatible[(course_codes[i], course_codes[j])]
+            for j in range(i + 1, n_courses)
+        ]
+        for i in range(n_courses)
+    ]
+    chosen = [None] * n_courses
+
+    def extend(depth, live):
+        if depth == n_courses:
+            yield tuple(chosen)
+            return
+
+        for choice in iter_bits(live[depth]):
+            narrowed = live[: depth + 1]
+            for rows, choices in zip(later_rows[depth], live[depth + 1 :]):
+                choices &= rows[choice]
+                if not choices:
+                    break
+                narrowed.append(choices)
+            else:
+                chosen[depth] = courses[depth][choice]
+                yield from extend(depth + 1, narrowed)
+
+    yield from extend(0, list(domains))
+
+
+def make_arc_consistent(
+    domains: Annotated[dict, "course code -> bitset of its choices left"],
+    compatibility: CompatibilityTable,
+    supports: Annotated[
+        Optional[list[str]], "courses the others must agree with"
+    ] = None,
+) -> bool:
+    """
+    Function that removes every choice of a course which clashes with all the
+    choices left of another course (AC-3), until no more choices can be removed.
+    The domains are changed in place.
+
+    Args:
+        domains (dict): course code -> bitset of the choices left of the course
+        compatibility (CompatibilityTable): compatibility of the choices of the courses
+        supports (list[str], optional): if given, the choices of every course are only
+          checked against these courses, instead of against every other course
+
+    Returns:
+        bool: False if a course has no choices left, True otherwise
+    """
+    supports = set(domains if supports is None else supports)
+    queue = deque((c1, c2) for c2 in supports for c1 in domains if c1 != c2)
+    queued = set(queue)
+
+    while queue:
+        c1, c2 = queue.popleft()
+        queued.discard((c1, c2))
+
+        rows = compatibility.compatible[(c1, c2)]
+        revised = domains[c1]
+        for choice in iter_bits(revised):
+            if not rows[choice] & domains[c2]:
+                revised ^= 1 << choice
+
+        if revised != domains[c1]:
+            domains[c1] = revised
+            if c1 in supports:
+                # choices of the other courses may have lost their only support
+                for c in domains:
+                    if c != c1 and c != c2 and (c, c1) not in queued:
+                        queue.append((c, c1))
+                        queued.add((c, c1))
+
+    return all(domains.values())
+
+
+def count_free_days(
+    busy: Annotated[int, "bitset of the days having classes"],
+    free_days: Annotated[list[str], "list of days to be free if possible"],
+) -> int:
+    """
+    Function that counts how many of the free days have no classes
+
+    Args:
+        busy (int): bitset of the days having classes, bit i is DAYS[i]
+        free_days (list): list of days to be free if possible
+
+    Returns:
+        int: number of free days without classes
+    """
+    return sum(1 for day in free_days if not busy >> DAYS.index(day) & 1)
+
+
+def may_match_free_days(
+    busy: Annotated[int, "bitset of the days having classes so far"],
+    free_days: Annotated[list[str], "list of days to be free if possible"],
+    strong: Annotated[bool, "whether to use strong filter or not"] = False,
+) -> bool:
+    """
+    Function that checks whether a partial timetable can still match the free
+    days. The number of free days only goes down as sections are added, so once
+    a partial timetable does not match, none of its extensions do.
+
+    Args:
+        busy (int): bitset of the days having classes so far, bit i is DAYS[i]
+        free_days (list): list of days to be free if possible
+        strong (bool, optional): whether to use strong filter or not. Defaults to False.
+
+    Returns:
+        bool: whether the partial timetable matches the free days
+    """
+    n_free = count_free_days(busy, free_days)
+    return (n_free > 0 and not strong) or n_free == len(free_days)
+
+
+def backtrack_counted_timetables(
+    courses: Annotated[list, "candidate choices of each course in the timetable"],
+    compatibility: CompatibilityTable,
+    day_counts: Annotated[list, "number of classes on each day of every choice"],
+    keep_branch: Optional[Callable[[tuple, int], bool]] = None,
+) -> Iterator[tuple]:
+    """
+    Generator that does the same search as backtrack_timetables, but also adds
+    up the number of classes on each day as the choices are assigned, so every
+    timetable comes out with its daily counts without going over its sections again.
+
+    Args:
+        courses (list): candidate (course code, section combination) choices of
+          each course, as yielded by generate_course_domains
+        compatibility (CompatibilityTable): compatibility of the choices of the courses
+        day_counts (list): for each course, the number of classes on each day (in
+          the order of DAYS) of every choice, from CourseIndex.choice_day_counts
+        keep_branch (Callable[[tuple, int], bool], optional): called with the daily
+          counts so far and the bitset of the days (bit i is DAYS[i]) having classes
+          so far, a branch is pruned if it returns False. It must stay False for
+          every extension of the branch, as classes are only ever added.
+
+    Yields:
+        tuple: (timetable without any clashes, number of classes on each day)
+    """
+    if not all(courses):
+        return
+
+    course_codes = [domain[0][0] for domain in courses]
+    n_courses = len(courses)
+    later_rows = [
+        [
+            compatibility.compatible[(course_codes[i], course_codes[j])]
+            for j in range(i + 1, n_courses)
+        ]
+        for i in range(n_courses)
+    ]
+    # bitset of the days each choice has classes on
+    busy_days = [
+        [sum(1 << i for i, count in enumerate(counts) if count) for counts in domain]
+        for domain in day_counts
+    ]
+    chosen = [None] * n_courses
+
+    def extend(depth, live, counts, busy):
+        if depth == n_courses:
+            yield tuple(chosen), counts
+            return
+
+        for choice in iter_bits(live[depth]):
+            narrowed = live[: depth + 1]
+            for rows, choices in zip(later_rows[depth], live[depth + 1 :]):
+                choices &= rows[choice]
+                if not choices:
+                    break
+                narrowed.append(choices)
+            else:
+                choice_counts = tuple(
+                    [a + b for a, b in zip(counts, day_counts[depth][choice])]
+                )
+                choice_busy = busy | busy_days[depth][choice]
+                if keep_branch is not None and not keep_branch(
+                    choice_counts, choice_busy
+                ):
+                    continue
+                chosen[depth] = courses[depth][choice]
+                yield from extend(depth + 1, narrowed, choice_counts, choice_busy)
+
+    yield from extend(
+        0,
+        [compatibility.valid[code] for code in course_codes],
+        (0,) * len(DAYS),
+        0,
+    )
+
+
+def iter_backtracking_timetables(
+    sect_seperated_json: Annotated[
+        dict, "filtered json with courses seperated into sections"
+    ],
+    json: Annotated[dict, "filtered json file"],
+    n_dels: Annotated[int, "number of DELs selected"],
+    n_opels: Annotated[int, "number of OPELs selected"],
+    n_huels: Annotated[int, "number of HUELs selected"],
+    index: Optional[CourseIndex] = None,
+) -> Iterator[tuple]:
+    """
+    Generator that yields all timetables without clashes (classes and exams)
+    using backtracking search instead of generating and then filtering
+
+    Args:
+        sect_seperated_json (dict): filtered json with courses seperated into sections
+        json (dict): filtered json file, i.e, with only courses selected
+        n_dels (int): number of DELs selected
+        n_opels (int): number of OPELs selected
+        n_huels (int): number of HUELs selected
+        index (CourseIndex, optional): compiled course index of the filtered json
+
+    Yields:
+        tuple: timetable without any clashes (classes and exams)
+    """
+    if index is None:
+        index = CourseIndex(json)
+
+    course_domains = list(
+        generate_course_domains(sect_seperated_json, n_dels, n_opels, n_huels)
+    )
+    compatibility = CompatibilityTable(course_domains, index)
+
+    for courses in course_domains:
+        yield from backtrack_timetables(courses, compatibility)
+
+
+def iter_constraint_timetables(
+    sect_seperated_json: Annotated[
+        dict, "filtered json with courses seperated into sections"
+    ],
+    json: Annotated[dict, "filtered json file"],
+    n_dels: Annotated[int, "number of DELs selected"],
+    n_opels: Annotated[int, "number of OPELs selected"],
+    n_huels: Annotated[int, "number of HUELs selected"],
+    index: Optional[CourseIndex] = None,
+    free_days: Annotated[Optional[list[str]], "days which must be free"] = None,
+) -> Iterator[tuple]:
+    """
+    Generator that yields all timetables without clashes (classes and exams)
+    using constraint propagation. The choices of each course are its domain,
+    which is narrowed down before searching:
+
+    1. choices with classes on any of the free days are removed (if given),
+    2. choices which clash with every choice left of a CDC are removed, once
+       for all combinations of electives as the CDCs are in every one of them,
+    3. the domains of each combination of electives are made arc consistent,
+       and combinations where a course has no choices left are skipped.
+
+    The narrowed domains are then searched by backtracking, so the timetables
+    come in the same order as from the other engines.
+
+    Args:
+        sect_seperated_json (dict): filtered json with courses seperated into sections
+        json (dict): filtered json file, i.e, with only courses selected
+        n_dels (int): number of DELs selected
+        n_opels (int): number of OPELs selected
+        n_huels (int): number of HUELs selected
+        index (CourseIndex, optional): compiled course index of the filtered json
+        free_days (list[str], optional): days which must not have any classes,
+          like the strong filter of sort_acc_to_heuristics. Defaults to None.
+
+    Yields:
+        tuple: timetable without any clashes (classes and exams)
+    """
+    if index is None:
+        index = CourseIndex(json)
+
+    course_domains = list(
+        generate_course_domains(sect_seperated_json, n_dels, n_opels, n_huels)
+    )
+    compatibility = CompatibilityTable(course_domains, index)
+    domains = dict(compatibility.valid)
+
+    if free_days:
+        free_slots = 0
+        for day in free_days:
+            for hour in range(1, N_HOURS + 1):
+                free_slots |= SLOT_BITS[(day, hour)]
+        for course_code, domain in compatibility.domains.items():
+            for choice in iter_bits(domains[course_code]):
+                if index.choice_mask(*domain[choice]) & free_slots:
+                    domains[course_code] ^= 1 << choice
+
+    make_arc_consistent(
+        domains,
+        compatibility,
+        [
+            course_code
+            for course_code in sect_seperated_json["CDCs"]
+            if course_code in domains
+        ],
+    )
+
+    for courses in course_domains:
+        if not all(courses):
+            continue
+
+        course_codes = [domain[0][0] for domain in courses]
+        combination_domains = {code: domains[code] for code in course_codes}
+        if not make_arc_consistent(combination_domains, compatibility):
+            continue
+
+        yield from backtrack_timetables(
+            courses,
+            compatibility,
+            [combination_domains[code] for code in course_codes],
+        )
+
+
+# number of slots the partial timetables of a MaskIndex are bucketed by
+KEY_SLOTS = 12
+
+
+class MaskIndex:
+    """Index of partial timetables by their slot masks, to find the ones which
+    do not take up any slot of a given mask without going through all of them.
+
+    The partial timetables are put into buckets by which of a few key slots they
+    take up. A bucket can only hold partial timetables disjoint from a mask if its
+    key slots are disjoint from the mask, so the other buckets are skipped.
+    """
+
+    def __init__(self, partials, key_mask):
+        """
+        Args:
+            partials (list[tuple]): (partial timetable, slot mask) of each partial timetable
+            key_mask (int): bitmask of the key slots the partial timetables are bucketed by
+        """
+        self.masks = [mask for _, mask in partials]
+        self.key_mask = key_mask
+        # key slots taken up -> positions of the partial timetables, ascending
+        self.buckets = {}
+        for position, mask in enumerate(self.masks):
+            self.buckets.setdefault(mask & key_mask, []).append(position)
+
+    def disjoint(self, mask: int) -> list[int]:
+        """
+        positions of the partial timetables which do not take up any slot of a mask
+
+        Args:
+            mask (int): bitmask of the slots
+
+        Returns:
+            list[int]: positions of the partial timetables, ascending
+        """
+        positions = []
+        for key, bucket in self.buckets.items():
+            if not key & mask:
+                positions.extend(p for p in bucket if not self.masks[p] & mask)
+        positions.sort()
+        return positions
+
+
+def get_key_mask(
+    masks: Annotated[Iterable[int], "slot masks of the queries to the index"],
+    n_slots: Annotated[int, "number of key slots"] = KEY_SLOTS,
+) -> int:
+    """
+    Function that picks the key slots of a MaskIndex, the slots taken up most
+    often by the masks it will be queried with, as those rule out the most buckets
+
+    Args:
+        masks (Iterable[int]): slot masks the index will be queried with
+        n_slots (int, optional): number of key slots. Defaults to KEY_SLOTS.
+
+    Returns:
+        int: bitmask of the key slots
+    """
+    slot_counts = Counter(bit for mask in masks for bit in iter_bits(mask))
+    return sum(1 << bit for bit, _ in slot_counts.most_common(n_slots))
+
+
+def get_partial_timetables(
+    courses: Annotated[
+        list, "candidate choices of each course in the partial timetable"
+    ],
+    compatibility: CompatibilityTable,
+    index: CourseIndex,
+) -> list[tuple]:
+    """
+    Function that finds all partial timetables without clashes (classes and
+    exams) of some of the courses, along with the slots each one takes up
+
+    Args:
+        courses (list): candidate (course code, section combination) choices of
+          each course of the partial timetable
+        compatibility (CompatibilityTable): compatibility of the choices of the courses
+        index (CourseIndex): compiled course index of the filtered json
+
+    Returns:
+        list[tuple]: (partial timetable, slot mask) in the order of the cartesian
+          product of the choices
+    """
+    if not courses:
+        return [((), 0)]
+    return [
+        (partial_timetable, index.timetable_mask(partial_timetable))
+        for partial_timetable in backtrack_timetables(courses, compatibility)
+    ]
+
+
+def iter_cdc_join_timetables(
+    sect_seperated_json: Annotated[
+        dict, "filtered json with courses seperated into sections"
+    ],
+    json: Annotated[dict, "filtered json file"],
+    n_dels: Annotated[int, "number of DELs selected"],
+    n_opels: Annotated[int, "number of OPELs selected"],
+    n_huels: Annotated[int, "number of HUELs selected"],
+    index: Optional[CourseIndex] = None,
+    indexed_join: Annotated[bool, "whether to join through a MaskIndex"] = False,
+) -> Iterator[tuple]:
+    """
+    Generator that yields all timetables without clashes (classes and exams).
+    The CDCs are the same in every combination of electives, so their partial
+    timetables without clashes are found once, and every combination of electives
+    is joined against them instead of searching through the CDCs again.
+
+    With indexed_join, the CDC partial timetables are put into a MaskIndex, so
+    each elective partial timetable is only checked against the buckets of CDC
+    partial timetables which can be disjoint from it.
+
+    Args:
+        sect_seperated_json (dict): filtered json with courses seperated into sections
+        json (dict): filtered json file, i.e, with only courses selected
+        n_dels (int): number of DELs selected
+        n_opels (int): number of OPELs selected
+        n_huels (int): number of HUELs selected
+        index (CourseIndex, optional): compiled course index of the filtered json
+        indexed_join (bool, optional): whether to join through a MaskIndex. Defaults to False.
+
+    Yields:
+        tuple: timetable without any clashes (classes and exams)
+    """
+    if index is None:
+        index = CourseIndex(json)
+
+    course_domains = list(
+        generate_course_domains(sect_seperated_json, n_dels, n_opels, n_huels)
+    )
+    compatibility = CompatibilityTable(course_domains, index)
+
+    # generate_course_domains puts the CDCs first in every combination
+    n_cdcs = len(sect_seperated_json["CDCs"])
+    cdc_partials = None
+    cdc_exams = None
+    mask_index = None
+
+    for courses in course_domains:
+        if not all(courses):
+            continue
+
+        if cdc_partials is None:
+            cdc_partials = get_partial_timetables(
+                courses[:n_cdcs], compatibility, index
+            )
+            cdc_exams = [
+                index.get_course(domain[0][0]).exam_slots for domain in courses[:n_cdcs]
+            ]
+            if indexed_join:
+                elective_masks = (
+                    index.choice_mask(*choice)
+                    for course_code, domain in compatibility.domains.items()
+                    if course_code not in sect_seperated_json["CDCs"]
+                    for choice in domain
+                )
+                mask_index = MaskIndex(
+                    cdc_partials,
+                    get_key_mask(mask for mask in elective_masks if mask is not None),
+                )
+
+        # exams only depend on the courses, so the electives either clash with
+        # the exams of the CDCs in all the joined timetables or in none
+        elective_exams = [
+            index.get_course(domain[0][0]).exam_slots for domain in courses[n_cdcs:]
+        ]
+        if any(
+            mid_1 == mid_2 or compre_1 == compre_2
+            for mid_1, compre_1 in elective_exams
+            for mid_2, compre_2 in cdc_exams
+        ):
+            continue
+
+        elective_partials = get_partial_timetables(
+            courses[n_cdcs:], compatibility, index
+        )
+        if mask_index is None:
+            # the CDCs come first in the cartesian product, so looping over the CDC
+            # partials on the outside keeps the order of the other engines
+            for cdc_partial, cdc_mask in cdc_partials:
+                for elective_partial, elective_mask in elective_partials:
+                    if not cdc_mask & elective_mask:
+                        yield cdc_partial + elective_partial
+            continue
+
+        # (position of the CDC partial, position of the elective partial) of every
+        # disjoint pair, sorted into the order of the cartesian product
+        matches = []
+        for elective_position, (_, elective_mask) in enumerate(elective_partials):
+            matches.extend(
+                (cdc_position, elective_position)
+                for cdc_position in mask_index.disjoint(elective_mask)
+            )
+        matches.sort()
+        for cdc_position, elective_position in matches:
+            yield cdc_partials[cdc_position][0] + elective_partials[elective_position][
+                0
+            ]
+
+
+def iter_meet_in_the_middle_timetables(
+    sect_seperated_json: Annotated[
+        dict, "filtered json with courses seperated into sections"
+    ],
+    json: Annotated[dict, "filtered json file"],
+    n_dels: Annotated[int, "number of DELs selected"],
+    n_opels: Annotated[int, "number of OPELs selected"],
+    n_huels: Annotated[int, "number of HUELs selected"],
+    index: Optional[CourseIndex] = None,
+) -> Iterator[tuple]:
+    """
+    Generator that yields all timetables without clashes (classes and exams) by
+    finding the partial timetables of the CDCs and of the electives separately,
+    and joining them through a MaskIndex (see iter_cdc_join_timetables)
+
+    Args:
+        sect_seperated_json (dict): filtered json with courses seperated into sections
+        json (dict): filtered json file, i.e, with only courses selected
+        n_dels (int): number of DELs selected
+        n_opels (int): number of OPELs selected
+        n_huels (int): number of HUELs selected
+        index (CourseIndex, optional): compiled course index of the filtered json
+
+    Yields:
+        tuple: timetable without any clashes (classes and exams)
+    """
+    yield from iter_cdc_join_timetables(
+        sect_seperated_json,
+        json,
+        n_dels,
+        n_opels,
+        n_huels,
+        index,
+        indexed_join=True,
+    )
+
+
+def iter_counted_backtracking_timetables(
+    sect_seperated_json: Annotated[
+        dict, "filtered json with courses seperated into sections"
+    ],
+    json: Annotated[dict, "filtered json file"],
+    n_dels: Annotated[int, "number of DELs selected"],
+    n_opels: Annotated[int, "number of OPELs selected"],
+    n_huels: Annotated[int, "number of HUELs selected"],
+    index: Optional[CourseIndex] = None,
+) -> Iterator[tuple]:
+    """
+    Generator that yields the same timetables as iter_backtracking_timetables,
+    along with the number of classes on each day, added up as sections are assigned.
+
+    Args:
+        sect_seperated_json (dict): filtered json with courses seperated into sections
+        json (dict): filtered json file, i.e, with only courses selected
+        n_dels (int): number of DELs selected
+        n_opels (int): number of OPELs selected
+        n_huels (int): number of HUELs selected
+        index (CourseIndex, optional): compiled course index of the filtered json
+
+    Yields:
+        tuple: (timetable, daily_counts), daily_counts in the order of DAYS
+    """
+    if index is None:
+        index = CourseIndex(json)
+
+    course_domains = list(
+        generate_course_domains(sect_seperated_json, n_dels, n_opels, n_huels)
+    )
+    compatibility = CompatibilityTable(course_domains, index)
+
+    for courses in course_domains:
+        if not all(courses):
+            continue
+
+        day_counts = [
+            [index.choice_day_counts(*choice) for choice in domain]
+            for domain in courses
+        ]
+        yield from backtrack_counted_timetables(courses, compatibility, day_counts)
+
+
+def sort_acc_to_heuristics_branch_and_bound(
+    sect_seperated_json: Annotated[
+        dict, "filtered json with courses seperated into sections"
+    ],
+    json: Annotated[dict, "filtered json file"],
+    n_dels: Annotated[int, "number of DELs selected"],
+    n_opels: Annotated[int, "number of OPELs selected"],
+    n_huels: Annotated[int, "number of HUELs selected"],
+    free_days: Annotated[list[str], "list of days to be free if possible"],
+    lite_order: Annotated[
+        list[str],
+        "increasing order of how lite you want days to be (earlier means more lite)",
+    ],
+    exam_fit_strategy: Optional[str] = None,
+    filter_exams_on_same_day=False,
+    filter: Annotated[bool, "whether to filter or to just sort"] = False,
+    strong: Annotated[bool, "whether to use strong filter or not"] = False,
+    n_top: Annotated[int, "number of best timetables to return"] = 100,
+    index: Optional[CourseIndex] = None,
+    stage_counts: Optional[dict] = None,
+) -> list:
+    """
+    Function that returns the n_top best timetables, the same as calling
+    sort_acc_to_heuristics with n_top on all timetables without clashes, but
+    without going through all of them.
+
+    The sort key is compared heuristic by heuristic, and the heuristics of a
+    partial timetable bound the ones of all its extensions: the daily scores only
+    go up and the number of free days only goes down as sections are added, the
+    exam heuristics only depend on the courses. Matching the free days can only
+    go from True to False, so the first heuristic is bounded by False, except
+    when it is True for every timetable that is kept (no free days, or the
+    filter drops the ones that do not match). A branch is pruned as soon
+    as its bound is no better than the n_top-th best timetable found so far.
+    Timetables are searched in the order they are generated in, so one tying
+    with the n_top-th best would be ranked after it and is pruned as well.
+
+    Args:
+        sect_seperated_json (dict): filtered json with courses seperated into sections
+        json (dict): filtered json file, i.e, with only courses selected
+        n_dels (int): number of DELs selected
+        n_opels (int): number of OPELs selected
+        n_huels (int): number of HUELs selected
+        free_days (list): list of days to be free if possible
+        lite_order (list): increasing order of how lite you want days to be (earlier means more lite)
+        exam_fit_strategy (str, optional): the strategy to use to sort exam spread seconds
+        filter_exams_on_same_day (bool): whether to reduce rank of timetables which have exams on same day
+        filter (bool, optional): whether to filter or to just sort. Defaults to False.
+        strong (bool, optional): whether to use strong filter or not. Defaults to False.
+        n_top (int, optional): number of best timetables to return. Defaults to 100.
+        index (CourseIndex, optional): compiled course index of the filtered json
+        stage_counts (dict, optional): if given, the number of branches pruned by
+          the bound is stored under "pruned branches"
+
+    Returns:
+        list: list of the n_top best timetables after sorting.
+    """
+    if index is None:
+        index = CourseIndex(json)
+
+    if n_top < 1:
+        return []
+
+    course_domains = list(
+        generate_course_domains(sect_seperated_json, n_dels, n_opels, n_huels)
+    )
+    compatibility = CompatibilityTable(course_domains, index)
+    exam_spread_handler = ExamSpread(json, index)
+    sort_order_mask = get_sort_order_mask(exam_fit_strategy, filter_exams_on_same_day)
+    lite_positions = [DAYS.index(day) for day in lite_order]
+
+    # lowest value the free days heuristic of any timetable that is kept can have
+    match_bound = not free_days or filter
+
+    # (sort key, position in the generation order, decorated timetable) of the
+    # best timetables found so far, kept sorted
+    best = []
+    n_generated = 0
+    n_pruned = 0
+
+    for courses in course_domains:
+        if not all(courses):
+            continue
+
+        exam_spread = exam_spread_handler.compute([domain[0] for domain in courses])
+        # the heuristics after the number of free days are the exam heuristics,
+        # which are the same for every timetable of these courses
+        exam_heuristics = get_heuristics(
+            [0] * len(DAYS),
+            exam_spread,
+            [],
+            lite_order,
+            exam_fit_strategy,
+            filter_exams_on_same_day,
+        )[3:]
+
+        def keep_branch(counts, busy):
+            nonlocal n_pruned
+            if filter and not may_match_free_days(busy, free_days, strong):
+                return False
+            if len(best) < n_top:
+                return True
+            bound = (
+                match_bound,
+                [counts[i] for i in lite_positions],
+                count_free_days(busy, free_days),
+                *exam_heuristics,
+            )
+            if get_sort_key((bound, None), sort_order_mask) < best[-1][0]:
+                return True
+            n_pruned += 1
+            return False
+
+        if not keep_branch((0,) * len(DAYS), 0):
+            continue
+
+        day_counts = [
+            [index.choice_day_counts(*choice) for choice in domain]
+            for domain in courses
+        ]
+        for timetable, daily_counts in backtrack_counted_timetables(
+            courses, compatibility, day_counts, keep_branch
+        ):
+            heuristics = get_heuristics(
+                daily_counts,
+                exam_spread,
+                free_days,
+                lite_order,
+                exam_fit_strategy,
+                filter_exams_on_same_day,
+                filter,
+                strong,
+            )
+            if heuristics is None:
+                continue
+
+            decorated_tt = (heuristics, timetable)
+            sort_key = get_sort_key(decorated_tt, sort_order_mask)
+            if len(best) < n_top or sort_key < best[-1][0]:
+                bisect.insort(best, (sort_key, n_generated, decorated_tt))
+                del best[n_top:]
+            n_generated += 1
+
+    if stage_counts is not None:
+        stage_counts["pruned branches"] = n_pruned
+
+    result_list = [decorated_tt for _, _, decorated_tt in best]
+    reorder_daily_scores(result_list, lite_order)
+
+    return result_list
+
+
+def count_timetables(
+    courses: Annotated[list, "candidate choices of each course in the timetable"],
+    index: CourseIndex,
+) -> int:
+    """
+    Function that counts the timetables without class clashes in the cartesian
+    product of the choices of the courses, without generating any of them.
+
+    The count of the timetables which extend a partial timetable only depends on
+    the slots it takes up that the later courses could use, so it is worked out
+    once for every such set of slots (memoized over slot masks). Choices with the
+    same slots are counted together.
+
+    Args:
+        courses (list): candidate (course code, section combination) choices of
+          each course, as yielded by generate_course_domains
+        index (CourseIndex): compiled course index of the filtered json
+
+    Returns:
+        int: number of timetables without class clashes
+    """
+    n_courses = len(courses)
+    # number of choices of each course with each slot mask
+    mask_counts = [
+        Counter(
+            mask
+            for mask in (index.choice_mask(*choice) for choice in domain)
+            if mask is not None
+        )
+        for domain in courses
+    ]
+    # slots which any of the courses from a depth onwards can take up
+    later_slots = [0] * (n_courses + 1)
+    for depth in reversed(range(n_courses)):
+        later_slots[depth] = later_slots[depth + 1]
+        for mask in mask_counts[depth]:
+            later_slots[depth] |= mask
+
+    memo = {}
+
+    def count(depth, occupied):
+        if depth == n_courses:
+            return 1
+        if (depth, occupied) not in memo:
+            memo[(depth, occupied)] = sum(
+                n_choices * count(depth + 1, (occupied | mask) & later_slots[depth + 1])
+                for mask, n_choices in mask_counts[depth].items()
+                if not occupied & mask
+            )
+        return memo[(depth, occupied)]
+
+    return count(0, 0)
+
+
+def iter_timetable_counts(
+    sect_seperated_json: Annotated[
+        dict, "filtered json with courses seperated into sections"
+    ],
+    json: Annotated[dict, "filtered json file"],
+    n_dels: Annotated[int, "number of DELs selected"],
+    n_opels: Annotated[int, "number of OPELs selected"],
+    n_huels: Annotated[int, "number of HUELs selected"],
+    index: Optional[CourseIndex] = None,
+) -> Iterator[tuple]:
+    """
+    Generator that counts the timetables without clashes of every combination
+    of electives, without generating any timetable
+
+    Args:
+        sect_seperated_json (dict): filtered json with courses seperated into sections
+        json (dict): filtered json file, i.e, with only courses selected
+        n_dels (int): number of DELs selected
+        n_opels (int): number of OPELs selected
+        n_huels (int): number of HUELs selected
+        index (CourseIndex, optional): compiled course index of the filtered json
+
+    Yields:
+        tuple: (course codes of the electives of the combination, number of
+          timetables without clashes (classes), number of timetables without
+          clashes (classes and exams))
+    """
+    if index is None:
+        index = CourseIndex(json)
+
+    for courses in generate_course_domains(
+        sect_seperated_json, n_dels, n_opels, n_huels
+    ):
+        electives = tuple(
+            domain[0][0]
+            for domain in courses
+            if domain and domain[0][0] not in sect_seperated_json["CDCs"]
+        )
+        if not all(courses):
+            yield electives, 0, 0
+            continue
+
+        n_class_free = count_timetables(courses, index)
+
+        # exams only depend on the courses, so they clash in all timetables or in none
+        mids, compres = zip(
+            *(index.get_course(domain[0][0]).exam_slots for domain in courses)
+        )
+        if len(set(mids)) != len(mids) or len(set(compres)) != len(compres):
+            yield electives, n_class_free, 0
+        else:
+            yield electives, n_class_free, n_class_free
+
+
+def iter_filtered_timetables(
+    sect_seperated_json: Annotated[
+        dict, "filtered json with courses seperated into sections"
+    ],
+    json: Annotated[dict, "filtered json file"],
+    n_dels: Annotated[int, "number of DELs selected"],
+    n_opels: Annotated[int, "number of OPELs selected"],
+    n_huels: Annotated[int, "number of HUELs selected"],
+    index: Optional[CourseIndex] = None,
+) -> Iterator[tuple]:
+    """
+    Generator that yields all timetables without clashes (classes and exams)
+    by generating every timetable and then filtering out the clashing ones
+
+    Args:
+        sect_seperated_json (dict): filtered json with courses seperated into sections
+        json (dict): filtered json file, i.e, with only courses selected
+        n_dels (int): number of DELs selected
+        n_opels (int): number of OPELs selected
+        n_huels (int): number of HUELs selected
+        index (CourseIndex, optional): compiled course index of the filtered json
+
+    Yields:
+        tuple: timetable without any clashes (classes and exams)
+    """
+    exhaustive_timetables = iter_exhaustive_timetables(
+        sect_seperated_json, n_dels, n_opels, n_huels
+    )
+    yield from iter_remove_exam_clashes(
+        iter_remove_clashes(exhaustive_timetables, json, index), json, index
+    )
+
+
+# all engines yield the same timetables in the same order
+SEARCH_ENGINES = {
+    "exhaustive": iter_filtered_timetables,
+    "backtracking": iter_backtracking_timetables,
+    "constraint": iter_constraint_timetables,
+    "cdc-join": iter_cdc_join_timetables,
+    "meet-in-the-middle": iter_meet_in_the_middle_timetables,
+    "vectorized": iter_vectorized_timetables,
+}
@@ -0,0 +1,246 @@
+import numpy as np
+from array import array
+from typing import Annotated, Iterable, Optional
+from course_index import DAYS, CourseIndex, TimetableStore
+from sort_heuristics import ExamSpread
+from timetables import get_heuristics, reorder_daily_scores
+from vectorized import rank_heuristic_columns
+
+
+class TimetableSession:
+    """The timetables without clashes of one set of courses, kept so that they
+    can be ranked again for any number of preferences without searching again.
+
+    Everything about a timetable that does not depend on the preferences (the
+    number of classes on each day and the exam spread) is worked out once when
+    the session is created and kept in flat arrays, so ranking is done on
+    columns of them (see rank_heuristic_columns).
+    """
+
+    def __init__(
+        self,
+        timetables: Annotated[Iterable, "timetables without clashes"],
+        json: Annotated[dict, "filtered json file"],
+        index: Optional[CourseIndex] = None,
+    ):
+        """
+        Args:
+            timetables (Iterable): timetables without clashes (classes and exams)
+            json (dict): filtered json file, i.e, with only courses selected
+            index (CourseIndex, optional): compiled course index of the filtered json
+        """
+        if index is None:
+            index = CourseIndex(json)
+        self.index = index
+
+        self.store = TimetableStore(index)
+
+        self.exam_spread_handler = ExamSpread(json, index)
+        # number of classes on each day of every timetable, one row of
+        # len(DAYS) counts per timetable
+        self.day_counts = array("H")
+        # exam spread (in microseconds) and whether there are exams on the same
+        # day of every distinct set of courses, and which one each timetable has
+        self.exam_spreads = array("q")
+        self.exams_on_same_day = array("b")
+        self.exam_spread_ids = array("I")
+        self.exam_spread_id_of_courses = {}
+
+        for timetable in timetables:
+            self.add(timetable)
+
+    def __getstate__(self) -> dict:
+        # a pickled session only keeps what is needed to rank its timetables
+        return {
+            "store": self.store,
+            "day_counts": self.day_counts,
+            "exam_spreads": self.exam_spreads,
+            "exams_on_same_day": self.exams_on_same_day,
+            "exam_spread_ids": self.exam_spread_ids,
+        }
+
+    def __setstate__(self, state: dict) -> None:
+        # timetables cannot be added to an unpickled session, as it has no index
+        self.index = None
+        self.__dict__.update(state)
+
+    def add(
+        self,
+        timetable: Annotated[tuple, "timetable without clashes"],
+        daily_counts: Annotated[
+            Optional[list[int]], "number of classes on each day, M to Su"
+        ] = None,
+    ) -> int:
+        """
+        adds a timetable to the session
+
+        Args:
+            timetable (tuple): timetable without clashes (classes and exams)
+            daily_counts (list[int], optional): number of classes of the timetable
+              on each day, in the order of DAYS. Worked out from the index if not given.
+
+        Returns:
+            int: row number of the timetable
+        """
+        if daily_counts is None:
+            daily_counts = [0] * len(DAYS)
+            for choice in timetable:
+                for day, count in enumerate(self.index.choice_day_counts(*choice)):
+                    daily_counts[day] += count
+        self.day_counts.extend(daily_counts)
+
+        course_codes = tuple(course_code for course_code, _ in timetable)
+        if course_codes not in self.exam_spread_id_of_courses:
+            self.exam_spread_id_of_courses[course_codes] = len(self.exam_spreads)
+            spread, exams_on_same_day = self.exam_spread_handler.compute_spread(
+                timetable
+            )
+            self.exam_spreads.append(spread)
+            self.exams_on_same_day.append(exams_on_same_day)
+        self.exam_spread_ids.append(self.exam_spread_id_of_courses[course_codes])
+
+        return self.store.add(timetable)
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def rank_rows(
+        self,
+        free_days: Annotated[list[str], "list of days to be free if possible"],
+        lite_order: Annotated[
+            list[str],
+            "increasing order of how lite you want days to be (earlier means more lite)",
+        ],
+        exam_fit_strategy: Optional[str] = None,
+        filter_exams_on_same_day=False,
+        filter: Annotated[bool, "whether to filter or to just sort"] = False,
+        strong: Annotated[bool, "whether to use strong filter or not"] = False,
+        n_top: Annotated[Optional[int], "number of best timetables to keep"] = None,
+    ) -> np.ndarray:
+        """
+        ranks the timetables of the session for a set of preferences, without
+        putting together their heuristics or decoding them
+
+        Args:
+            free_days (list): list of days to be free if possible
+            lite_order (list): increasing order of how lite you want days to be (earlier means more lite)
+            exam_fit_strategy (str, optional): the strategy to use to sort exam spread seconds
+            filter_exams_on_same_day (bool): whether to reduce rank of timetables which have exams on same day
+            filter (bool, optional): whether to filter or to just sort. Defaults to False.
+            strong (bool, optional): whether to use strong filter or not. Defaults to False.
+            n_top (int, optional): if given, only the n_top best timetables are kept. Defaults to None.
+
+        Returns:
+            np.ndarray: row numbers of the timetables in ranked order, without the
+              filtered out ones
+        """
+        exam_spread_ids = np.frombuffer(self.exam_spread_ids, dtype=np.uint32)
+        exam_spreads = np.frombuffer(self.exam_spreads, dtype=np.int64)
+        exams_on_same_day = np.frombuffer(self.exams_on_same_day, dtype=np.int8)
+
+        return rank_heuristic_columns(
+            np.frombuffer(self.day_counts, dtype=np.uint16),
+            exam_spreads[exam_spread_ids],
+            exams_on_same_day[exam_spread_ids].astype(bool),
+            free_days,
+            lite_order,
+            exam_fit_strategy,
+            filter_exams_on_same_day,
+            filter,
+            strong,
+            n_top,
+        )
+
+    def get_decorated(
+        self,
+        rows: Annotated[Iterable[int], "row numbers of timetables of the session"],
+        free_days: Annotated[list[str], "list of days to be free if possible"],
+        lite_order: Annotated[
+            list[str],
+            "increasing order of how lite you want days to be (earlier means more lite)",
+        ],
+        exam_fit_strategy: Optional[str] = None,
+        filter_exams_on_same_day=False,
+    ) -> list:
+        """
+        timetables of the session decorated with their heuristics, like the ones
+        in the list sort_acc_to_heuristics gives
+
+        Args:
+            rows (Iterable[int]): row numbers of the timetables, e.g, from rank_rows
+            free_days (list): list of days to be free if possible
+            lite_order (list): increasing order of how lite you want days to be (earlier means more lite)
+            exam_fit_strategy (str, optional): the strategy to use to sort exam spread seconds
+            filter_exams_on_same_day (bool): whether to reduce rank of timetables which have exams on same day
+
+        Returns:
+            list: (heuristics, timetable) of each row, in the order of rows
+        """
+        n_days = len(DAYS)
+        result_list = []
+        for row in rows:
+            exam_spread_id = self.exam_spread_ids[row]
+            heuristics = get_heuristics(
+                self.day_counts[row * n_days : (row + 1) * n_days],
+                (
+                    # same as ExamSpread.compute
+                    self.exam_spreads[exam_spread_id] / 10**6,
+                    bool(self.exams_on_same_day[exam_spread_id]),
+                ),
+                free_days,
+                lite_order,
+                exam_fit_strategy,
+                filter_exams_on_same_day,
+            )
+            result_list.append((heuristics, self.store[row]))
+
+        reorder_daily_scores(result_list, lite_order)
+
+        return result_list
+
+    def rerank(
+        self,
+        free_days: Annotated[list[str], "list of days to be free if possible"],
+        lite_order: Annotated[
+            list[str],
+            "increasing order of how lite you want days to be (earlier means more lite)",
+        ],
+        exam_fit_strategy: Optional[str] = None,
+        filter_exams_on_same_day=False,
+        filter: Annotated[bool, "whether to filter or to just sort"] = False,
+        strong: Annotated[bool, "whether to use strong filter or not"] = False,
+        n_top: Annotated[Optional[int], "number of best timetables to keep"] = None,
+    ) -> list:
+        """
+        ranks the timetables of the session for a set of preferences, giving the
+        same list as sort_acc_to_heuristics would give for them
+
+        Args:
+            free_days (list): list of days to be free if possible
+            lite_order (list): increasing order of how lite you want days to be (earlier means more lite)
+            exam_fit_strategy (str, optional): the strategy to use to sort exam spread seconds
+            filter_exams_on_same_day (bool): whether to reduce rank of timetables which have exams on same day
+            filter (bool, optional): whether to filter or to just sort. Defaults to False.
+            strong (bool, optional): whether to use strong filter or not. Defaults to False.
+            n_top (int, optional): if given, only the n_top best timetables are kept. Defaults to None.
+
+        Returns:
+            list: list of timetables after sorting.
+        """
+        ranked_rows = self.rank_rows(
+            free_days,
+            lite_order,
+            exam_fit_strategy,
+            filter_exams_on_same_day,
+            filter,
+            strong,
+            n_top,
+        )
+        # the heuristics are only put together for the timetables that are kept
+        return self.get_decorated(
+            ranked_rows.tolist(),
+            free_days,
+            lite_order,
+            exam_fit_strategy,
+            filter_exams_on_same_day,
+        )
@@ -17,55 +17,101 @@ class ExamSpread:
     """Utility class that computes heuristics based on spread of exam times."""
 
     YEAR = dt.datetime.now().year
+    # exam times are stored as microseconds since this instant
+    EPOCH = dt.datetime(1970, 1, 1)
 
-    def __init__(self, json):
+    def __init__(self, json, index=None):
+        """
+        Args:
+            json (dict): filtered json file, i.e, with only courses selected
+            index (CourseIndex, optional): compiled course index of the filtered json,
+              its flat table of courses is used instead of the json if given
+        """
         self.json = json
+        self.course_exam_times = {}
+
+        if index is not None:
+            courses_iso = []
+            for course in index.courses:
+                if course.exam_times is not None:
+                    # already computed when the course database was built
+                    self.course_exam_times[course.code] = course.exam_times
+                else:
+                    courses_iso.append((course.code, course.exams_iso))
+        else:
+            courses_iso = []
+            COURSE_CLASSES = ["CDCs", "DEls", "HUELs", "OPELs"]
+            for course_class in COURSE_CLASSES:
+                for course_code, course in json[course_class].items():
+                    courses_iso.append((course_code, course["exams_iso"][0]))
+
+        # parse the exam times of every course once, into a tuple of
+        # (midsem, compre) where each is a (timestamp, day ordinal) of the
+        # middle of the exam, or None if the course does not have that exam
+        # (currently does not try to parse time from "exams" as it too slow)
+        for course_code, exams_dict in courses_iso:
+            self.course_exam_times.setdefault(
+                course_code,
+                (
+                    self.parse_exam_time(exams_dict.get("midsem", "")),
+                    self.parse_exam_time(exams_dict.get("compre", "")),
+                ),
+            )
 
-    @staticmethod
-    def _compute_date_spread(sorted_date_times):
-        total_date_spread = dt.timedelta(0)
-        for i in range(len(sorted_date_times) - 1):
-            delta_consecutive = sorted_date_times[i + 1] - sorted_date_times[i]
-            total_date_spread = total_date_spread + delta_consecutive
-        return total_date_spread
+    @classmethod
+    def parse_exam_time(cls, double_iso_string):
+        """(timestamp, day ordinal) of the middle of an exam, as it is compared by
+        compute_spread, None if there is no exam (an empty string)"""
+        if not double_iso_string:
+            return None
+        avg_time = ExamTime(double_iso_string).avg_time
+        timestamp = (avg_time - cls.EPOCH) // dt.timedelta(microseconds=1)
+        return (timestamp, avg_time.toordinal())
+
+    def compute_spread(self, timetable_courses) -> tuple[int, bool]:
+        """computes the exam spread in microseconds (total consecutive difference in
+        the time of exams, i.e, the time between the first and the last midsem plus
+        that of the compre) along with if there are two exams on the same day.
 
-    def __get_course_exam_times(self, timetable):
-        course_exam_times = []
-        COURSE_CLASSES = ["CDCs", "DEls", "HUELs", "OPELs"]
-        for course in timetable:
-            course_code, _ = course
+        Args:
+            timetable_courses (tuple): the courses contained in the timetable as a
+              tuple of course code and list of sections chosen
 
-            for course_class in COURSE_CLASSES:
-                if course_code in (courses_dict := self.json[course_class]):
-                    # currently does not try to parse time from
-                    # "exams" as it too slow
-                    exams_dict = courses_dict[course_code]["exams_iso"][0]
-                    midsem_time_str = exams_dict.get("midsem", "")
-                    compre_time_str = exams_dict.get("compre", "")
-                    break
-
-            else:
+        Returns:
+            tuple of the of the type (int, bool) which contains the total exam
+            spread microseconds and also whether there are two exams on the same day
+        """
+        midsem_timestamps = []
+        compre_timestamps = []
+        midsem_days = set()
+        compre_days = set()
+        exams_on_same_day = False
+        for course_code, _ in timetable_courses:
+            try:
+                mid, compre = self.course_exam_times[course_code]
+            except KeyError:
                 raise Exception("Course code not found in any catagory")
 
-            course_exam_times.append(
-                (
-                    course_code,
-                    ExamTime(midsem_time_str) if midsem_time_str else None,
-                    ExamTime(compre_time_str) if compre_time_str else None,
-                )
-            )
-        return course_exam_times
+            if mid is not None:
+                timestamp, day = mid
+                midsem_timestamps.append(timestamp)
+                exams_on_same_day = exams_on_same_day or day in midsem_days
+                midsem_days.add(day)
+            if compre is not None:
+                timestamp, day = compre
+                compre_timestamps.append(timestamp)
+                exams_on_same_day = exams_on_same_day or day in compre_days
+                compre_days.add(day)
+
+        # the consecutive differences of the sorted times add up to max - min
+        midsem_date_spread = (
+            max(midsem_timestamps) - min(midsem_timestamps) if midsem_timestamps else 0
+        )
+        compre_date_spread = (
+            max(compre_timestamps) - min(compre_timestamps) if compre_timestamps else 0
+        )
 
-    def __compute_exam_day_clash(self, exam_times):
-        dates = set()
-        exams_on_same_day = False
-        for exam_time in exam_times:
-            if (date_str := exam_time.date().isoformat()) in dates:
-                exams_on_same_day = True
-                break
-            else:
-                dates.add(date_str)
-        return exams_on_same_day
+        return midsem_date_spread + compre_date_spread, exams_on_same_day
 
     def compute(self, timetable_courses) -> tuple[float, bool]:
         """computes the exam_spread (total consecutive difference in the time of exams)
@@ -79,23 +125,6 @@ class ExamSpread:
             tuple of the of the type (float, bool) which contains the total exam
             spread seconds and also whether there are two exams on the same day
         """
-        midsem_exam_times = []
-        compre_exam_times = []
-        for _, mid, compre in self.__get_course_exam_times(timetable_courses):
-            if mid is not None:
-                midsem_exam_times.append(mid.avg_time)
-            if compre is not None:
-                compre_exam_times.append(compre.avg_time)
-
-        midsem_date_spread = self._compute_date_spread(sorted(midsem_exam_times))
-        compre_date_spread = self._compute_date_spread(sorted(compre_exam_times))
-
-        midsem_day_clash = self.__compute_exam_day_clash(midsem_exam_times)
-        compre_day_clash = self.__compute_exam_day_clash(compre_exam_times)
-
-        exams_on_same_day = midsem_day_clash or compre_day_clash
-
-        return (
-            (midsem_date_spread + compre_date_spread).total_seconds(),
-            exams_on_same_day,
-        )
+        spread_microseconds, exams_on_same_day = self.compute_spread(timetable_courses)
+        # same as timedelta.total_seconds() of the spread
+        return spread_microseconds / 10**6, exams_on_same_day
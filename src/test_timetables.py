@@ -0,0 +1,571 @@
+import copy
+import json
+import os
+import pickle
+import struct
+import tempfile
+import timetables
+import course_db
+from itertools import combinations, product
+import search
+from course_index import DAYS, CourseIndex, TimetableStore, get_slots_mask
+from parallel import sort_acc_to_heuristics_parallel
+from parse_times import parse_compre_time, parse_compre_times, parse_time, parse_times
+from result_cache import ResultCache, get_query_key
+from session import TimetableSession
+from sort_heuristics import ExamSpread
+from vectorized import (
+    iter_remove_clashes_vectorized,
+    iter_remove_exam_clashes_vectorized,
+    remove_clashes_vectorized,
+    remove_exam_clashes_vectorized,
+)
+
+# (CDCs, DEls, HUELs, OPELs, number of DELs, number of OPELs, number of HUELs)
+COURSE_SETS = {
+    "electives": (
+        ["CS F213", "CS F214", "CS F222", "ECON F211"],
+        ["CS F301", "CS F351", "CS F372"],
+        ["HSS F228", "HSS F235"],
+        ["ECON F212", "ECON F213", "MGTS F211"],
+        2,
+        1,
+        1,
+    ),
+    "exam clashes": (
+        ["CS F214", "CS F222"],
+        ["MATH F214", "CS F351", "CS F301", "CS F372", "ECON F212", "BITS F234"],
+        ["HSS F235", "HSS F228"],
+        [],
+        2,
+        0,
+        1,
+    ),
+    "only CDCs": (["CS F213", "CS F214", "CS F222", "MATH F211"], [], [], [], 0, 0, 0),
+    "few electives": (["CS F214"], ["CS F301", "CS F351"], [], [], 2, 0, 0),
+}
+
+# (free days, lite order, exam fit strategy, filter exams on same day, filter, strong)
+PREFERENCES = [
+    (["S"], ["S", "Su", "M", "T", "W", "Th", "F"], None, False, False, False),
+    (
+        ["S", "M"],
+        ["M", "S", "Su", "T", "W", "Th", "F"],
+        "Close Together",
+        True,
+        False,
+        False,
+    ),
+    (
+        ["W", "Su"],
+        ["W", "S", "Su", "M", "T", "Th", "F"],
+        "Spaced Apart",
+        True,
+        True,
+        False,
+    ),
+    (["S", "Su"], ["F", "S", "Su", "M", "T", "W", "Th"], None, True, True, True),
+    ([], ["Th", "S", "Su", "M", "T", "W", "F"], "Close Together", False, False, False),
+]
+
+N_TOPS = [1, 7, 100]
+
+
+def load_course_set(timetable_json: dict, name: str) -> tuple:
+    """
+    Function to filter the timetable json to one of the course sets.
+
+    Args:
+        timetable_json (dict): main timetable json file
+        name (str): name of the course set in COURSE_SETS
+
+    Returns:
+        tuple: (sect_seperated_json, filtered_json, n_dels, n_opels, n_huels)
+    """
+    CDCs, DEls, HUELs, OPELs, n_dels, n_opels, n_huels = COURSE_SETS[name]
+    filtered_json = timetables.get_filtered_json(
+        timetable_json, CDCs, DEls, HUELs, OPELs
+    )
+    sect_seperated_json = timetables.separate_sections_into_types(filtered_json)
+    return sect_seperated_json, filtered_json, n_dels, n_opels, n_huels
+
+
+def get_course(filtered_json: dict, course_code: str) -> dict:
+    """
+    Function to get a course of the filtered json, whichever category it is in.
+    """
+    (course,) = [
+        filtered_json[course_type][course_code]
+        for course_type in ["CDCs", "DEls", "HUELs", "OPELs"]
+        if course_code in filtered_json[course_type]
+    ]
+    return course
+
+
+def has_class_clashes(timetable: tuple, filtered_json: dict) -> bool:
+    """
+    Function to check a timetable for two sections on the same day and hour on
+    the raw json, slot by slot, like the baseline filter did.
+    """
+    slots = set()
+    for course_code, sections_chosen in timetable:
+        course = get_course(filtered_json, course_code)
+        for sec in sections_chosen:
+            for slot in course["sections"][sec]["schedule"]:
+                for day_hour in product(slot["days"], slot["hours"]):
+                    if day_hour in slots:
+                        return True
+                    slots.add(day_hour)
+
+    return False
+
+
+def has_exam_clashes(timetable: tuple, filtered_json: dict) -> bool:
+    """
+    Function to check a timetable for two courses with the same midsem or compre
+    on the raw json, like the baseline filter did (a missing exam counts as "").
+    """
+    midsems = set()
+    compres = set()
+    for course_code, _ in timetable:
+        exams = get_course(filtered_json, course_code)["exams"][0]
+        if exams.get("midsem", "") in midsems or exams.get("compre", "") in compres:
+            return True
+        midsems.add(exams.get("midsem", ""))
+        compres.add(exams.get("compre", ""))
+
+    return False
+
+
+def get_reference(course_set: tuple) -> list:
+    """
+    Function to get the timetables without clashes of a course set by brute
+    force, going over every combination of sections in the order the baseline
+    generation did (electives only ever take their first section combination).
+    Nothing of the code being tested is used, besides filtering the json.
+
+    Returns:
+        list: timetables without clashes (classes and exams), in generation order
+    """
+    sect_seperated_json, filtered_json, n_dels, n_opels, n_huels = course_set
+
+    def get_choices(course_type: str, course_code: str) -> list:
+        sections = sect_seperated_json[course_type][course_code]
+        return [
+            (course_code, comb)
+            for comb in product(
+                *[sections[t] for t in ["L", "P", "T"] if sections.get(t) is not None]
+            )
+        ]
+
+    elective_picks = []
+    for course_type, n in [("DEls", n_dels), ("HUELs", n_huels), ("OPELs", n_opels)]:
+        courses = [
+            get_choices(course_type, code) for code in sect_seperated_json[course_type]
+        ]
+        picks = [[choices[0] for choices in comb] for comb in combinations(courses, n)]
+        if courses and picks:
+            elective_picks.append(picks)
+
+    cdcs = [get_choices("CDCs", code) for code in sect_seperated_json["CDCs"]]
+    reference = []
+    for picks in product(*elective_picks):
+        electives = [[choice] for pick in picks for choice in pick]
+        for timetable in product(*cdcs, *electives):
+            if not has_class_clashes(timetable, filtered_json) and not has_exam_clashes(
+                timetable, filtered_json
+            ):
+                reference.append(timetable)
+
+    return reference
+
+
+def test_search_engines(course_set: tuple, reference: list) -> str:
+    """
+    Function to test that the plain pipeline, generate_exhaustive_timetables ->
+    remove_clashes -> remove_exam_clashes, and every search engine give the
+    timetables found by brute force, in the same order.
+    """
+    sect_seperated_json, filtered_json, n_dels, n_opels, n_huels = course_set
+    exhaustive = timetables.generate_exhaustive_timetables(
+        sect_seperated_json, n_dels, n_opels, n_huels
+    )
+    clash_free = timetables.remove_clashes(exhaustive, filtered_json)
+    assert (
+        timetables.remove_exam_clashes(clash_free, filtered_json) == reference
+    ), "Plain pipeline failed!"
+
+    for engine, iter_timetables in search.SEARCH_ENGINES.items():
+        assert (
+            list(iter_timetables(*course_set)) == reference
+        ), f"{engine} engine failed!"
+
+    return "TEST PASS"
+
+
+def test_vectorized_filters(course_set: tuple, reference: list) -> str:
+    """
+    Function to test that the numpy clash filters give the timetables of the
+    baseline filters checked slot by slot, in the same order, whatever the size
+    of the batches.
+    """
+    sect_seperated_json, filtered_json, n_dels, n_opels, n_huels = course_set
+    exhaustive = timetables.generate_exhaustive_timetables(
+        sect_seperated_json, n_dels, n_opels, n_huels
+    )
+    clash_free = [
+        timetable
+        for timetable in exhaustive
+        if not has_class_clashes(timetable, filtered_json)
+    ]
+
+    assert (
+        remove_clashes_vectorized(exhaustive, filtered_json) == clash_free
+    ), "Vectorized clash filter failed!"
+    assert (
+        remove_exam_clashes_vectorized(clash_free, filtered_json) == reference
+    ), "Vectorized exam clash filter failed!"
+    # a small batch size splits the timetables over many batches
+    assert (
+        list(
+            iter_remove_clashes_vectorized(
+                iter(exhaustive), filtered_json, batch_size=7
+            )
+        )
+        == clash_free
+    ), "Vectorized clash filter failed!"
+    assert (
+        list(
+            iter_remove_exam_clashes_vectorized(
+                iter(clash_free), filtered_json, batch_size=7
+            )
+        )
+        == reference
+    ), "Vectorized exam clash filter failed!"
+
+    return "TEST PASS"
+
+
+def test_ranking(course_set: tuple, reference: list) -> str:
+    """
+    Function to test that every way of ranking timetables gives the list of
+    sort_acc_to_heuristics on the timetables found by brute force, for every
+    set of preferences, in full and for the best N_TOPS.
+    """
+    sect_seperated_json, filtered_json, n_dels, n_opels, n_huels = course_set
+    session = TimetableSession(reference, filtered_json)
+    # with the daily counts of the search, as main builds it, and then cached
+    counted_session = TimetableSession([], filtered_json)
+    for timetable, daily_counts in search.iter_counted_backtracking_timetables(
+        *course_set
+    ):
+        counted_session.add(timetable, daily_counts)
+    counted_session = pickle.loads(pickle.dumps(counted_session))
+
+    for preferences in PREFERENCES:
+        *ranking_args, filter, strong = preferences
+        expected = timetables.sort_acc_to_heuristics(
+            reference, filtered_json, *ranking_args, filter=filter, strong=strong
+        )
+
+        assert (
+            session.rerank(*ranking_args, filter=filter, strong=strong) == expected
+        ), "Session rerank failed!"
+        assert (
+            counted_session.rerank(*ranking_args, filter=filter, strong=strong)
+            == expected
+        ), "Counted session rerank failed!"
+
+        for n_top in N_TOPS:
+            assert (
+                timetables.sort_acc_to_heuristics(
+                    iter(reference),
+                    filtered_json,
+                    *ranking_args,
+                    filter=filter,
+                    strong=strong,
+                    n_top=n_top,
+                )
+                == expected[:n_top]
+            ), "Bounded heap failed!"
+            assert (
+                search.sort_acc_to_heuristics_branch_and_bound(
+                    *course_set,
+                    *ranking_args,
+                    filter=filter,
+                    strong=strong,
+                    n_top=n_top,
+                )
+                == expected[:n_top]
+            ), "Branch and bound failed!"
+            assert (
+                session.rerank(*ranking_args, filter=filter, strong=strong, n_top=n_top)
+                == expected[:n_top]
+            ), "Session rerank failed!"
+
+    *ranking_args, filter, strong = PREFERENCES[1]
+    assert sort_acc_to_heuristics_parallel(
+        *course_set, *ranking_args, filter=filter, strong=strong, workers=2
+    ) == timetables.sort_acc_to_heuristics(
+        reference, filtered_json, *ranking_args, filter=filter, strong=strong
+    ), "Parallel ranking failed!"
+
+    return "TEST PASS"
+
+
+def test_branch_and_bound_pruning(course_set: tuple, reference: list) -> str:
+    """
+    Function to test that branch and bound prunes branches when every timetable
+    matches the free days, i.e, there are no free days or they are filtered on
+    (Sunday is free in all the course sets).
+    """
+    sect_seperated_json, filtered_json, n_dels, n_opels, n_huels = course_set
+    lite_order = PREFERENCES[0][1]
+
+    for free_days, filter in [([], False), (["Su"], True)]:
+        expected = timetables.sort_acc_to_heuristics(
+            reference,
+            filtered_json,
+            free_days,
+            lite_order,
+            filter=filter,
+            strong=filter,
+        )
+        stage_counts = {}
+        ranked = search.sort_acc_to_heuristics_branch_and_bound(
+            *course_set,
+            free_days,
+            lite_order,
+            filter=filter,
+            strong=filter,
+            n_top=1,
+            stage_counts=stage_counts,
+        )
+        assert ranked == expected[:1], "Branch and bound failed!"
+        assert stage_counts["pruned branches"] > 0, "Branch and bound did not prune!"
+
+    return "TEST PASS"
+
+
+def test_counts(course_set: tuple, reference: list) -> str:
+    """
+    Function to test that the timetables counted without generating them add up
+    to the number of timetables found by brute force.
+    """
+    sect_seperated_json, filtered_json, n_dels, n_opels, n_huels = course_set
+    counts = list(search.iter_timetable_counts(*course_set))
+
+    CDCs = set(sect_seperated_json["CDCs"])
+    for electives, _, n_free in counts:
+        expected = sum(
+            1
+            for timetable in reference
+            if tuple(code for code, _ in timetable if code not in CDCs) == electives
+        )
+        assert n_free == expected, "Count of a combination of electives failed!"
+    assert sum(n_free for _, _, n_free in counts) == len(reference), "Count failed!"
+
+    return "TEST PASS"
+
+
+def test_prefilter_sections(course_set: tuple, reference: list) -> str:
+    """
+    Function to test that removing the sections which cannot have the free days
+    free before searching gives the timetables of the strong filter.
+    """
+    sect_seperated_json, filtered_json, n_dels, n_opels, n_huels = course_set
+    index = CourseIndex(filtered_json)
+
+    for free_days in [[day] for day in DAYS] + [["S", "Su"], ["M", "F"]]:
+        expected = timetables.sort_acc_to_heuristics(
+            reference, filtered_json, free_days, DAYS, filter=True, strong=True
+        )
+        pruned_json = timetables.prefilter_sections(
+            copy.deepcopy(sect_seperated_json),
+            free_days,
+            n_dels,
+            n_opels,
+            n_huels,
+            index,
+        )
+        if pruned_json is None:
+            ranked = []
+        else:
+            ranked = timetables.sort_acc_to_heuristics(
+                search.iter_filtered_timetables(
+                    pruned_json, filtered_json, n_dels, n_opels, n_huels
+                ),
+                filtered_json,
+                free_days,
+                DAYS,
+                filter=True,
+                strong=True,
+            )
+        assert ranked == expected, "Prefilter failed!"
+
+    return "TEST PASS"
+
+
+def test_timetable_store(course_set: tuple, reference: list) -> str:
+    """
+    Function to test that timetables come out of a store as they went in.
+    """
+    store = TimetableStore(CourseIndex(course_set[1]))
+    for timetable in reference:
+        store.add(timetable)
+
+    assert len(store) == len(reference), "Store failed!"
+    assert [store[row] for row in range(len(store))] == reference, "Store failed!"
+
+    return "TEST PASS"
+
+
+def test_result_cache() -> str:
+    """
+    Function to test that cached results are read back, that results which cannot
+    be read (e.g, pickled by an older version of the code) are treated as not
+    cached, and that the least recently used results are removed first.
+    """
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = ResultCache(cache_dir, max_bytes=10**6)
+        key = get_query_key("query", [1, 2], None)
+        assert key == get_query_key("query", (1, 2), None), "Query key failed!"
+        assert cache.get(key) is None, "Cache miss failed!"
+
+        cache.put(key, {"result": [1, 2, 3]})
+        assert cache.get(key) == {"result": [1, 2, 3]}, "Cache hit failed!"
+
+        # a pickle of an instance of a class that no longer exists
+        with open(os.path.join(cache_dir, key + ".pkl"), "wb") as f:
+            f.write(b"cmodule_that_does_not_exist\nStale\n(tR.")
+        assert cache.get(key) is None, "Stale result was not a cache miss!"
+
+        with open(os.path.join(cache_dir, key + ".pkl"), "wb") as f:
+            f.write(b"not a pickle")
+        assert cache.get(key) is None, "Unreadable result was not a cache miss!"
+
+        cache.max_bytes = 0
+        cache.put(key, "result")
+        assert os.listdir(cache_dir) == [], "Eviction failed!"
+
+    return "TEST PASS"
+
+
+def test_course_db(timetable_json: dict) -> str:
+    """
+    Function to test that the course database gives the section masks and exam
+    times compiled from the json, and that a database which is out of date (built
+    from another json file or by another version of the code) is not used.
+    """
+    with tempfile.TemporaryDirectory() as db_dir:
+        json_file = os.path.join(db_dir, "timetable.json")
+        with open("./files/timetable.json", "rb") as f:
+            contents = f.read()
+        with open(json_file, "wb") as f:
+            f.write(contents)
+        course_db.write_course_db(json_file)
+
+        loaded_json, db, json_hash = course_db.load_timetable_json(json_file)
+        assert loaded_json == timetable_json, "Loading the json failed!"
+        assert db is not None, "Loading the course database failed!"
+        for course_code, course in timetable_json["courses"].items():
+            section_masks, exam_times = db.get_compiled(course_code)
+            assert section_masks == {
+                sec: get_slots_mask(section["schedule"])
+                for sec, section in course["sections"].items()
+            }, "Section masks of the course database failed!"
+            exams_iso = course["exams_iso"][0] if course["exams_iso"] else {}
+            assert exam_times == (
+                ExamSpread.parse_exam_time(exams_iso.get("midsem", "")),
+                ExamSpread.parse_exam_time(exams_iso.get("compre", "")),
+            ), "Exam times of the course database failed!"
+        assert db.get_compiled("NOT F111") is None, "Missing course failed!"
+        db.close()
+
+        assert (
+            course_db.load_course_db(json_file, json_hash=bytes(32)) is None
+        ), "Database of another json file was used!"
+
+        with open(json_file, "ab") as f:
+            f.write(b"\n")
+        assert (
+            course_db.load_timetable_json(json_file)[1] is None
+        ), "Database of an edited json file was used!"
+        with open(json_file, "wb") as f:
+            f.write(contents)
+
+        with open(course_db.get_db_path(json_file), "r+b") as f:
+            f.seek(len(course_db.MAGIC))
+            f.write(struct.pack("<I", course_db.DB_VERSION + 1))
+        assert (
+            course_db.load_course_db(json_file) is None
+        ), "Database of another version was used!"
+
+        course_db.write_course_db(json_file)
+        with open(course_db.get_db_path(json_file), "r+b") as f:
+            f.truncate(os.path.getsize(course_db.get_db_path(json_file)) - 1)
+        assert (
+            course_db.load_course_db(json_file) is None
+        ), "Truncated database was used!"
+
+    return "TEST PASS"
+
+
+def test_parse_times() -> str:
+    """
+    Function to test that parsing a column of exam times at once gives the times
+    parsed one by one, in the same order.
+    """
+    midsems = [
+        "14/10 - 4.00 - 5.30PM",
+        "09/10 - 11.30 - 1.00PM",
+        "14/10 - 4.00 - 5.30PM",
+    ]
+    compres = ["21/12 AN", "06/12 FN", "21/12 AN"]
+
+    assert parse_times(midsems, 2023) == [
+        parse_time(midsem, 2023) for midsem in midsems
+    ], "Parsing midsem times failed!"
+    assert parse_compre_times(compres, 2023) == [
+        parse_compre_time(compre, 2023) for compre in compres
+    ], "Parsing compre times failed!"
+
+    return "TEST PASS"
+
+
+if __name__ == "__main__":
+    timetable_json = json.load(open("./files/timetable.json", "r"))
+
+    for name in COURSE_SETS:
+        course_set = load_course_set(timetable_json, name)
+        reference = get_reference(course_set)
+
+        # Test-1: search engines
+        print(name, "engines", test_search_engines(course_set, reference))
+
+        # Test-2: numpy clash filters
+        print(name, "numpy filters", test_vectorized_filters(course_set, reference))
+
+        # Test-3: ranking
+        print(name, "ranking", test_ranking(course_set, reference))
+
+        # Test-4: pruning of branch and bound
+        print(name, "pruning", test_branch_and_bound_pruning(course_set, reference))
+
+        # Test-5: counting
+        print(name, "counts", test_counts(course_set, reference))
+
+        # Test-6: prefilter for the strong filter
+        print(name, "prefilter", test_prefilter_sections(course_set, reference))
+
+        # Test-7: compact store of timetables
+        print(name, "store", test_timetable_store(course_set, reference))
+
+    # Test-8: cache of results
+    print("cache", test_result_cache())
+
+    # Test-9: parsing exam times
+    print("parse times", test_parse_times())
+
+    # Test-10: course database
+    print("course db", test_course_db(timetable_json))
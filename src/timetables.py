@@ -1,15 +1,24 @@
+import argparse
+import heapq
 import json
+import sys
+from functools import partial
 from itertools import product, combinations
-from typing import Annotated, Optional
+from typing import Annotated, Iterable, Iterator, Optional
 from prompt_user import AskUserInput, Choice
 from sort_heuristics import ExamSpread
+from course_index import DAYS, CourseIndex
+from course_db import load_timetable_json
+from result_cache import ResultCache, get_query_key
 
-DAYS = ["M", "T", "W", "Th", "F", "S", "Su"]
 EXAM_FIT_STRATEGIES = {
     "Close Together": 1,
     "Spaced Apart": -1,
 }
 
+# number of best timetables exported to my_timetables.json
+N_EXPORT = 100
+
 
 def get_filtered_json(
     json: Annotated[dict, "main timetable json file"],
@@ -127,26 +136,31 @@ def generate_intra_combinations(
     return combs
 
 
-def generate_exhaustive_timetables(
+def generate_course_domains(
     sect_seperated_json: Annotated[
         dict, "filtered json with courses seperated into sections"
     ],
     n_dels: Annotated[int, "number of DELs selected"],
     n_opels: Annotated[int, "number of OPELs selected"],
     n_huels: Annotated[int, "number of HUELs selected"],
-) -> list:
+) -> Iterator[list]:
     """
-    Function that generates all possible timetables (exhaustive and inclusive of clashes)
+    Generator that yields, for every combination of electives, the candidate
+    (course, section combination) choices of each course in the timetable.
+    The cartesian product of a yielded list is the set of timetables for that
+    combination of electives (exhaustive and inclusive of clashes)
 
     Args:
-        filtered_json (dict): filtered json file, i.e, with only courses selected
+        sect_seperated_json (dict): filtered json with courses seperated into sections
+        n_dels (int): number of DELs selected
+        n_opels (int): number of OPELs selected
+        n_huels (int): number of HUELs selected
 
-    Returns:
-        list: list of all possible timetables (exhaustive and inclusive of clashes)
+    Yields:
+        list: list of candidate choices for each course, in timetable order
     """
 
     combs = generate_intra_combinations(sect_seperated_json)
-    timetables = []
     cdcs = []
     dels = []
     opels = []
@@ -178,34 +192,98 @@ def generate_exhaustive_timetables(
 
     required = [dels, huels, opels]
     required = [i for i in required if i]
-    possible_combinations_temp = list(product(*required))
-    possible_combinations = []
-    for i in possible_combinations_temp:
+    for i in product(*required):
         combination = []
         for j in i:
             combination.extend(j)
-        possible_combinations.append(combination)
-    courses = []
 
-    for comb in possible_combinations:
         poss = []
         poss.extend(cdcs)
-        poss.extend([[c] for c in comb])
-        courses.append(poss)
+        poss.extend([[c] for c in combination])
+        yield poss
+
+
+def iter_exhaustive_timetables(
+    sect_seperated_json: Annotated[
+        dict, "filtered json with courses seperated into sections"
+    ],
+    n_dels: Annotated[int, "number of DELs selected"],
+    n_opels: Annotated[int, "number of OPELs selected"],
+    n_huels: Annotated[int, "number of HUELs selected"],
+) -> Iterator[tuple]:
+    """
+    Generator version of generate_exhaustive_timetables, timetables are
+    produced one at a time instead of being held in a list
+
+    Args:
+        sect_seperated_json (dict): filtered json with courses seperated into sections
+        n_dels (int): number of DELs selected
+        n_opels (int): number of OPELs selected
+        n_huels (int): number of HUELs selected
+
+    Yields:
+        tuple: timetable (exhaustive and inclusive of clashes)
+    """
+    for courses in generate_course_domains(
+        sect_seperated_json, n_dels, n_opels, n_huels
+    ):
+        yield from product(*courses)
+
+
+def generate_exhaustive_timetables(
+    sect_seperated_json: Annotated[
+        dict, "filtered json with courses seperated into sections"
+    ],
+    n_dels: Annotated[int, "number of DELs selected"],
+    n_opels: Annotated[int, "number of OPELs selected"],
+    n_huels: Annotated[int, "number of HUELs selected"],
+) -> list:
+    """
+    Function that generates all possible timetables (exhaustive and inclusive of clashes)
+
+    Args:
+        filtered_json (dict): filtered json file, i.e, with only courses selected
+
+    Returns:
+        list: list of all possible timetables (exhaustive and inclusive of clashes)
+    """
+    return list(
+        iter_exhaustive_timetables(sect_seperated_json, n_dels, n_opels, n_huels)
+    )
+
+
+def iter_remove_clashes(
+    timetables: Annotated[Iterable, "exhaustive iterable of all possible timetables"],
+    json: Annotated[dict, "filtered json file"],
+    index: Optional[CourseIndex] = None,
+) -> Iterator[tuple]:
+    """
+    Generator that filters out timetables with clashes, lazily consuming the
+    timetables it is given
 
-    timetables = list(product(*courses))
-    timetables = []
-    for i in range(len(courses)):
-        timetables.extend(list(product(*courses[i])))
-    return timetables
+    Args:
+        timetables (Iterable): exhaustive iterable of all possible timetables
+        json (dict): filtered json file
+        index (CourseIndex, optional): compiled course index of the filtered json,
+          built from json if not given
 
-    # timetables = list(product(cdcs, dels, huels, opels))
-    # return timetables
+    Yields:
+        tuple: timetable without clashes
+    """
+    if index is None:
+        index = CourseIndex(json)
+
+    for timetable in timetables:
+        # every section is a bitmask of the slots it uses, so a timetable
+        # has clashes if the masks of any two of its sections overlap
+        if index.timetable_mask(timetable) is not None:
+            yield timetable
 
 
 def remove_clashes(
     timetables: Annotated[list, "exhaustive list of all possible timetables"],
     json: Annotated[dict, "filtered json file"],
+    index: Optional[CourseIndex] = None,
 ) -> list:
     """
     Function that filters out timetables with clashes
@@ -213,75 +291,37 @@ def remove_clashes(
     Args:
         timetables (list): exhaustive list of all possible timetables
         json (dict): filtered json file
+        index (CourseIndex, optional): compiled course index of the filtered json
 
     Returns:
         list: list of timetables without clashes
     """
-    filtered = []
-    for timetable in timetables:
-        # times currently held as "in use" by some course's section
-        # format "DH" where D is the day and H is the hour
-        times: dict[str, bool] = dict()
-        clashes = False
-        for course in timetable:
-            course_code, sections_chosen = course
+    return list(iter_remove_clashes(timetables, json, index))
 
-            # find out which class the course belongs to and
-            # get all sections of the course
-            for course_class in ["CDCs", "DEls", "HUELs", "OPELs"]:
-                if course_code in json[course_class]:
-                    all_sections = json[course_class][course_code]["sections"]
-                    break
-            else:
-                raise Exception("Course code not found in any category")
-
-            for sec in sections_chosen:
-                sched = all_sections[sec]["schedule"]
-
-                # ts denotes all slots needed for the section
-                ts = []
-                for i in range(len(sched)):
-                    ts.extend(list(product(sched[i]["days"], sched[i]["hours"])))
-
-                # converting it to the string of required format "DH"
-                ts = [str(t[0]) + str(t[1]) for t in ts]
-
-                # if any slot in ts is already in times, then there is a clash
-                # if so, mark it as clashes and dont add it to the filtered list
-                for t in ts:
-                    if times.get(t) is not None:
-                        clashes = True
-                        break
-                    else:
-                        times[t] = True
-
-                if clashes:
-                    break
-            if clashes:
-                break
 
-        # if no clashes, add it to the filtered list
-        if not clashes:
-            filtered.append(timetable)
-
-    return filtered
-
-
-def remove_exam_clashes(
-    timetables: Annotated[list, "list of timetables without any clashes (classes)"],
+def iter_remove_exam_clashes(
+    timetables: Annotated[
+        Iterable, "iterable of timetables without any clashes (classes)"
+    ],
     json: Annotated[dict, "filtered json file"],
-):
+    index: Optional[CourseIndex] = None,
+) -> Iterator[tuple]:
     """
-    Function that filters out timetables with exam clashes.
+    Generator that filters out timetables with exam clashes, lazily consuming
+    the timetables it is given
 
     Args:
-        timetables (list): list of timetables without any clashes (classes)
+        timetables (Iterable): iterable of timetables without any clashes (classes)
         json (dict): filtered json file
+        index (CourseIndex, optional): compiled course index of the filtered json,
+          built from json if not given
 
-    Returns:
-        list: list of timetables without any clashes (classes and exams)
+    Yields:
+        tuple: timetable without any clashes (classes and exams)
     """
-    no_exam_clashes = []
+    if index is None:
+        index = CourseIndex(json)
+
     for timetable in timetables:
         mids_times: dict[str, int] = dict()
         compres_times: dict[str, int] = dict()
@@ -289,16 +329,8 @@ def remove_exam_clashes(
         for course in timetable:
             course_code, _ = course
 
-            # get from the json
-            for course_class in ["CDCs", "DEls", "HUELs", "OPELs"]:
-                if course_code in json[course_class]:
-                    exams_times = json[course_class][course_code]["exams"][0]
-                    break
-            else:
-                raise Exception("Course code not found in any category")
-
-            mid = exams_times.get("midsem", "")
-            compre = exams_times.get("compre", "")
+            # get from the course index
+            mid, compre = index.get_course(course_code).exam_slots
 
             mids_times[mid] = mids_times.get(mid, 0) + 1
             compres_times[compre] = compres_times.get(compre, 0) + 1
@@ -329,15 +361,34 @@ def remove_exam_clashes(
         #                 break
         #         if clashes:
         #             break
-        # add to filtered list only if no clashes
+        # pass on to the next stage only if no clashes
         if not clashes:
-            no_exam_clashes.append(timetable)
-    return no_exam_clashes
+            yield timetable
+
+
+def remove_exam_clashes(
+    timetables: Annotated[list, "list of timetables without any clashes (classes)"],
+    json: Annotated[dict, "filtered json file"],
+    index: Optional[CourseIndex] = None,
+):
+    """
+    Function that filters out timetables with exam clashes.
+
+    Args:
+        timetables (list): list of timetables without any clashes (classes)
+        json (dict): filtered json file
+        index (CourseIndex, optional): compiled course index of the filtered json
+
+    Returns:
+        list: list of timetables without any clashes (classes and exams)
+    """
+    return list(iter_remove_exam_clashes(timetables, json, index))
 
 
 def get_daywise_schedule(
     cf_timetable: Annotated[list, "timetable without clashes"],
     json: Annotated[dict, "filtered json file"],
+    index: Optional[CourseIndex] = None,
 ):
     """
     Returns dictionary containing the hour numbers (1 -> 8-9AM etc)
@@ -348,33 +399,57 @@ def get_daywise_schedule(
     Args:
         cf_timetable (list[tuple]): timetable without clashes
         json (dict): filtered json file, i.e, with only courses selected
+        index (CourseIndex, optional): compiled course index of the filtered json
     """
+    if index is None:
+        index = CourseIndex(json)
 
     schedule = {day: list() for day in DAYS}
 
-    for course in cf_timetable:
-        course_code, sections_chosen = course
-        # get from the json
-        for course_class in ["CDCs", "DEls", "HUELs", "OPELs"]:
-            if course_code in json[course_class]:
-                all_sections = json[course_class][course_code]["sections"]
-                break
-        else:
-            raise Exception("Course code not found in any category")
-
+    for course_code, sections_chosen in cf_timetable:
         for sec in sections_chosen:
-            sched = all_sections[sec]["schedule"]
             # since no clashes, we can just append the hours to the schedule
-            for i in range(len(sched)):
-                for day in sched[i]["days"]:
-                    schedule[day].append(sched[i]["hours"])
+            for day, hours in index.get_section(course_code, sec).day_hours:
+                schedule[day].append(hours)
 
     return schedule
 
 
-def sort_acc_to_heuristics(
-    timetables: Annotated[list, "list of timetables without clashes"],
-    json: Annotated[dict, "filtered json file"],
+def get_sort_order_mask(
+    exam_fit_strategy: Optional[str] = None,
+    filter_exams_on_same_day=False,
+) -> list[int]:
+    """
+    Function that returns the sort order mask, a multiplier mask whose
+    elements act on the heuristics of a timetable to determine ordering
+
+    Args:
+        exam_fit_strategy (str, optional): the strategy to use to sort exam spread seconds
+        filter_exams_on_same_day (bool): whether to reduce rank of timetables which have exams on same day
+
+    Returns:
+        list[int]: multiplier for each heuristic (1 -> ascending, -1 -> descending)
+    """
+    sort_order_mask = [
+        1,  # does_match_free_days -> ascending
+        1,  # daily_scores -> ascending
+        -1,  # n_free -> descending
+    ]
+
+    if filter_exams_on_same_day:
+        sort_order_mask.append(-1)  # timetables which have a clash are ranked lower
+
+    if exam_fit_strategy is not None:
+        assert exam_fit_strategy in EXAM_FIT_STRATEGIES
+        # ascending or descending based on which strategy is chosen
+        sort_order_mask.append(EXAM_FIT_STRATEGIES[exam_fit_strategy])
+
+    return sort_order_mask
+
+
+def get_heuristics(
+    daily_counts: Annotated[list[int], "number of classes on each day, M to Su"],
+    exam_spread: Annotated[tuple, "(total exam spread seconds, exams on same day)"],
     free_days: Annotated[list[str], "list of days to be free if possible"],
     lite_order: Annotated[
         list[str],
@@ -384,20 +459,16 @@ def sort_acc_to_heuristics(
     filter_exams_on_same_day=False,
     filter: Annotated[bool, "whether to filter or to just sort"] = False,
     strong: Annotated[bool, "whether to use strong filter or not"] = False,
-) -> list:
+) -> Optional[tuple]:
     """
-    Function that will sort all timetables based on whether the timetable
-    matches free days, the lite order, the total number of free days, and
-    exam fit strategy, and whether to filter exams on same day.
-
-    Note:
-      exam fit strategy, if specified, can be "Close Together" or "Spaced Apart".
-
-      Lite order is the order in which you want the days to be lite. For example, if you want Saturday to be the most lite day, then lite_order = ["S", "Su", "M", "T", "W", "Th", "F"] (set the order of the other 6 accordingly)
+    Function that puts together the heuristics of a timetable from the number
+    of classes it has on each day and its exam spread. The daily scores of the
+    heuristics are in lite order.
 
     Args:
-        timetables (list): list of timetables without clashes
-        json (dict): filtered json file, i.e, with only courses selected
+        daily_counts (list[int]): number of classes on each day, in the order of DAYS
+        exam_spread (tuple): (total exam spread seconds, exams on same day), as
+          computed by ExamSpread
         free_days (list): list of days to be free if possible
         lite_order (list): increasing order of how lite you want days to be (earlier means more lite)
         exam_fit_strategy (str, optional): the strategy to use to sort exam spread seconds
@@ -406,86 +477,138 @@ def sort_acc_to_heuristics(
         strong (bool, optional): whether to use strong filter or not. Defaults to False.
 
     Returns:
-        list: list of timetables after sorting.
+        tuple: heuristics of the timetable, None if it is filtered out
     """
+    heuristics = []
 
-    # sort order mask is a multiplier mask whose elements act on heuristic to
-    # determine ordering
-    day_dict = {day: i for i, day in enumerate(DAYS)}
-    result_list = []
+    # --- append heuristics in the order of their priority ---
 
-    sort_order_mask = [
-        1,  # does_match_free_days -> ascending
-        1,  # daily_scores -> ascending
-        -1,  # n_free -> descending
-    ]
+    # calulate number of free days
+    n_free = 0
+    for day in free_days:
+        if daily_counts[DAYS.index(day)] == 0:
+            n_free += 1
+
+    does_match_free_days = (n_free > 0 and not strong) or n_free == len(free_days)
+    if filter and not does_match_free_days:
+        return None
+
+    heuristics.append(does_match_free_days)
+
+    # reordering the daily scores acc to lite order
+    daily_scores = [daily_counts[DAYS.index(day)] for day in lite_order]
 
-    exam_spread_handler = ExamSpread(json)
+    heuristics.append(daily_scores)
+    heuristics.append(n_free)
+
+    total_spread_seconds, exam_on_same_day = exam_spread
 
     if filter_exams_on_same_day:
-        sort_order_mask.append(-1)  # timetables which have a clash are ranked lower
+        heuristics.append(exam_on_same_day)
 
     if exam_fit_strategy is not None:
-        assert exam_fit_strategy in EXAM_FIT_STRATEGIES
-        # ascending or descending based on which strategy is chosen
-        sort_order_mask.append(EXAM_FIT_STRATEGIES[exam_fit_strategy])
+        heuristics.append(total_spread_seconds)
 
-    def get_sort_key(decorated_tt):
-        heuristics, _ = decorated_tt
-        return tuple(
-            [
-                multiplier * heuristic
-                for multiplier, heuristic in zip(sort_order_mask, heuristics)
-            ]
-        )
+    return tuple(heuristics)
 
-    for timetable in timetables:
-        # will contain the hours of each day where there is a class.
-        # used for calculating the daily scores and if it matches the free days
-        schedule = get_daywise_schedule(timetable, json)
-        heuristics = []
 
-        # --- append heuristics in the order of their priority ---
+def iter_decorated_timetables(
+    timetables: Annotated[Iterable, "iterable of timetables without clashes"],
+    json: Annotated[dict, "filtered json file"],
+    free_days: Annotated[list[str], "list of days to be free if possible"],
+    lite_order: Annotated[
+        list[str],
+        "increasing order of how lite you want days to be (earlier means more lite)",
+    ],
+    exam_fit_strategy: Optional[str] = None,
+    filter_exams_on_same_day=False,
+    filter: Annotated[bool, "whether to filter or to just sort"] = False,
+    strong: Annotated[bool, "whether to use strong filter or not"] = False,
+    index: Optional[CourseIndex] = None,
+) -> Iterator[tuple]:
+    """
+    Generator that decorates each timetable with its heuristics, i.e, the
+    scoring stage of sort_acc_to_heuristics. The daily scores of the
+    heuristics are in lite order.
+
+    Args:
+        timetables (Iterable): iterable of timetables without clashes
+        json (dict): filtered json file, i.e, with only courses selected
+        free_days (list): list of days to be free if possible
+        lite_order (list): increasing order of how lite you want days to be (earlier means more lite)
+        exam_fit_strategy (str, optional): the strategy to use to sort exam spread seconds
+        filter_exams_on_same_day (bool): whether to reduce rank of timetables which have exams on same day
+        filter (bool, optional): whether to filter or to just sort. Defaults to False.
+        strong (bool, optional): whether to use strong filter or not. Defaults to False.
+        index (CourseIndex, optional): compiled course index of the filtered json
+
+    Yields:
+        tuple: timetable decorated with its heuristics, (heuristics, timetable)
+    """
+    if index is None:
+        index = CourseIndex(json)
 
-        # calulate number of free days
-        n_free = 0
-        for day in free_days:
-            if len(schedule[day]) == 0:
-                n_free += 1
+    exam_spread_handler = ExamSpread(json, index)
 
-        does_match_free_days = (n_free > 0 and not strong) or n_free == len(free_days)
-        if filter and not does_match_free_days:
+    for timetable in timetables:
+        # will contain the hours of each day where there is a class.
+        # used for calculating the daily scores and if it matches the free days
+        schedule = get_daywise_schedule(timetable, json, index)
+
+        heuristics = get_heuristics(
+            [len(schedule[day]) for day in DAYS],
+            exam_spread_handler.compute(timetable),
+            free_days,
+            lite_order,
+            exam_fit_strategy,
+            filter_exams_on_same_day,
+            filter,
+            strong,
+        )
+        if heuristics is None:
             continue
 
-        heuristics.append(does_match_free_days)
-
-        # calculating the daily scores and reordering them acc to lite order
-        daily_scores = [len(schedule[day]) for day in DAYS]
-        daily_scores = [daily_scores[day_dict[day]] for day in lite_order]
+        # decorate timetable with the heuristics
+        yield (heuristics, timetable)
 
-        heuristics.append(daily_scores)
-        heuristics.append(n_free)
 
-        total_spread_seconds, exam_on_same_day = exam_spread_handler.compute(timetable)
+def get_sort_key(
+    decorated_tt: Annotated[tuple, "timetable decorated with its heuristics"],
+    sort_order_mask: Annotated[list[int], "multiplier for each heuristic"],
+) -> tuple:
+    """
+    Function that returns the key a decorated timetable is sorted by
 
-        if filter_exams_on_same_day:
-            heuristics.append(exam_on_same_day)
+    Args:
+        decorated_tt (tuple): timetable decorated with its heuristics, (heuristics, timetable)
+        sort_order_mask (list[int]): multiplier for each heuristic, from get_sort_order_mask
 
-        if exam_fit_strategy is not None:
-            heuristics.append(total_spread_seconds)
+    Returns:
+        tuple: heuristics multiplied by their multipliers
+    """
+    heuristics, _ = decorated_tt
+    return tuple(
+        [
+            multiplier * heuristic
+            for multiplier, heuristic in zip(sort_order_mask, heuristics)
+        ]
+    )
 
-        # decorate timetable with the heuristics
-        decorated_tt = (
-            tuple(heuristics),
-            timetable,
-        )
-        result_list.append(decorated_tt)
 
-    result_list = sorted(result_list, key=get_sort_key)
+def reorder_daily_scores(
+    result_list: Annotated[list, "decorated timetables, daily scores in lite order"],
+    lite_order: Annotated[list[str], "lite order the daily scores are in"],
+) -> None:
+    """
+    Function that reorders the daily scores of decorated timetables from lite
+    order back to Monday to Sunday, in place
 
+    Args:
+        result_list (list): decorated timetables, with daily scores in lite order
+        lite_order (list): lite order the daily scores are in
+    """
     lite_order_index = {day: i for i, day in enumerate(lite_order)}
 
-    # reorder the daily scores back to Monday to Friday
     for i in range(len(result_list)):
         heuristics, timetable = result_list[i]
         before, daily_scores, *after = heuristics
@@ -493,10 +616,119 @@ def sort_acc_to_heuristics(
         heuristics = tuple([before, daily_scores, *after])
         result_list[i] = (heuristics, timetable)
 
+
+def sort_acc_to_heuristics(
+    timetables: Annotated[Iterable, "iterable of timetables without clashes"],
+    json: Annotated[dict, "filtered json file"],
+    free_days: Annotated[list[str], "list of days to be free if possible"],
+    lite_order: Annotated[
+        list[str],
+        "increasing order of how lite you want days to be (earlier means more lite)",
+    ],
+    exam_fit_strategy: Optional[str] = None,
+    filter_exams_on_same_day=False,
+    filter: Annotated[bool, "whether to filter or to just sort"] = False,
+    strong: Annotated[bool, "whether to use strong filter or not"] = False,
+    index: Optional[CourseIndex] = None,
+    n_top: Annotated[Optional[int], "number of best timetables to keep"] = None,
+) -> list:
+    """
+    Function that will sort all timetables based on whether the timetable
+    matches free days, the lite order, the total number of free days, and
+    exam fit strategy, and whether to filter exams on same day.
+
+    Note:
+      exam fit strategy, if specified, can be "Close Together" or "Spaced Apart".
+
+      Lite order is the order in which you want the days to be lite. For example, if you want Saturday to be the most lite day, then lite_order = ["S", "Su", "M", "T", "W", "Th", "F"] (set the order of the other 6 accordingly)
+
+    Args:
+        timetables (Iterable): iterable of timetables without clashes
+        json (dict): filtered json file, i.e, with only courses selected
+        free_days (list): list of days to be free if possible
+        lite_order (list): increasing order of how lite you want days to be (earlier means more lite)
+        exam_fit_strategy (str, optional): the strategy to use to sort exam spread seconds
+        filter_exams_on_same_day (bool): whether to reduce rank of timetables which have exams on same day
+        filter (bool, optional): whether to filter or to just sort. Defaults to False.
+        strong (bool, optional): whether to use strong filter or not. Defaults to False.
+        index (CourseIndex, optional): compiled course index of the filtered json
+        n_top (int, optional): if given, only the n_top best timetables are kept,
+          using a bounded heap instead of sorting all of them. Defaults to None.
+
+    Returns:
+        list: list of timetables after sorting.
+    """
+
+    decorated_timetables = iter_decorated_timetables(
+        timetables,
+        json,
+        free_days,
+        lite_order,
+        exam_fit_strategy,
+        filter_exams_on_same_day,
+        filter,
+        strong,
+        index,
+    )
+    result_list = rank_decorated_timetables(
+        decorated_timetables,
+        lite_order,
+        exam_fit_strategy,
+        filter_exams_on_same_day,
+        n_top,
+    )
+
     return result_list
 
 
-def export_to_json(timetables: list, filtered_json: dict, n_export: int = 100) -> None:
+def rank_decorated_timetables(
+    decorated_timetables: Annotated[
+        Iterable, "timetables decorated with their heuristics"
+    ],
+    lite_order: Annotated[list[str], "lite order the daily scores are in"],
+    exam_fit_strategy: Optional[str] = None,
+    filter_exams_on_same_day=False,
+    n_top: Annotated[Optional[int], "number of best timetables to keep"] = None,
+) -> list:
+    """
+    Function that sorts timetables which are already decorated with their
+    heuristics, i.e, the ranking stage of sort_acc_to_heuristics
+
+    Args:
+        decorated_timetables (Iterable): (heuristics, timetable) pairs, with the
+          daily scores in lite order, as yielded by iter_decorated_timetables
+        lite_order (list): lite order the daily scores are in
+        exam_fit_strategy (str, optional): the strategy to use to sort exam spread seconds
+        filter_exams_on_same_day (bool): whether to reduce rank of timetables which have exams on same day
+        n_top (int, optional): if given, only the n_top best timetables are kept,
+          using a bounded heap instead of sorting all of them. Defaults to None.
+
+    Returns:
+        list: list of timetables after sorting.
+    """
+
+    # sort order mask is a multiplier mask whose elements act on heuristic to
+    # determine ordering
+    sort_order_mask = get_sort_order_mask(exam_fit_strategy, filter_exams_on_same_day)
+    sort_key = partial(get_sort_key, sort_order_mask=sort_order_mask)
+
+    if n_top is None:
+        result_list = sorted(decorated_timetables, key=sort_key)
+    else:
+        # same as sorted(...)[:n_top], but only ever holds n_top timetables
+        result_list = heapq.nsmallest(n_top, decorated_timetables, key=sort_key)
+
+    reorder_daily_scores(result_list, lite_order)
+
+    return result_list
+
+
+def export_to_json(
+    timetables: list,
+    filtered_json: dict,
+    n_export: int = N_EXPORT,
+    index: Optional[CourseIndex] = None,
+) -> None:
     """
     Function that exports your timetables to a json file (in the sorted order)
 
@@ -504,66 +736,57 @@ def export_to_json(timetables: list, filtered_json: dict, n_export: int = 100) -
         timetables (list): list of timetables
         filtered_json (dict): filtered json file, i.e, with only courses selected
         n_export (int, optional): number of timetables to export. Defaults to 100.
+        index (CourseIndex, optional): compiled course index of the filtered json
 
     Returns:
         None
     """
+    if index is None:
+        index = CourseIndex(filtered_json)
+
     export = []
-    for (_, daily_scores, n_free, *_), timetable in timetables:
+    for decorated_tt in timetables:
+        (_, daily_scores, n_free, *_), timetable = decorated_tt
         export_tt = {}
         export_tt["free_matched"] = n_free
         export_tt["daily_scores"] = daily_scores
         export_tt["timetable"] = {}
-        for course in timetable:
-            export_tt["timetable"][course[0]] = {}
-            export_tt["timetable"][course[0]]["sections"] = {}
-            for sec in course[1]:
-                export_tt["timetable"][course[0]]["sections"][sec] = {}
-                export_tt["timetable"][course[0]]["sections"][sec]["schedule"] = []
-                if course[0] in filtered_json["CDCs"]:
-                    sched = filtered_json["CDCs"][course[0]]["sections"][sec][
-                        "schedule"
-                    ]
-                elif course[0] in filtered_json["DEls"]:
-                    sched = filtered_json["DEls"][course[0]]["sections"][sec][
-                        "schedule"
-                    ]
-                elif course[0] in filtered_json["HUELs"]:
-                    sched = filtered_json["HUELs"][course[0]]["sections"][sec][
-                        "schedule"
-                    ]
-                elif course[0] in filtered_json["OPELs"]:
-                    sched = filtered_json["OPELs"][course[0]]["sections"][sec][
-                        "schedule"
-                    ]
-                else:
-                    raise Exception("Course code not found in any category")
-                for i in range(len(sched)):
-                    export_tt["timetable"][course[0]]["sections"][sec][
-                        "schedule"
-                    ].append(
-                        {
-                            "days": sched[i]["days"],
-                            "hours": sched[i]["hours"],
-                        }
-                    )
-            if course[0] in filtered_json["CDCs"]:
-                exam = filtered_json["CDCs"][course[0]]["exams"][0]
-            elif course[0] in filtered_json["DEls"]:
-                exam = filtered_json["DEls"][course[0]]["exams"][0]
-            elif course[0] in filtered_json["HUELs"]:
-                exam = filtered_json["HUELs"][course[0]]["exams"][0]
-            elif course[0] in filtered_json["OPELs"]:
-                exam = filtered_json["OPELs"][course[0]]["exams"][0]
-            else:
-                raise Exception("Course code not found in any category")
-            export_tt["timetable"][course[0]]["exams"] = exam
+        for course_code, sections_chosen in timetable:
+            course = index.get_course(course_code)
+            export_tt["timetable"][course_code] = {}
+            export_tt["timetable"][course_code]["sections"] = {}
+            for sec in sections_chosen:
+                export_tt["timetable"][course_code]["sections"][sec] = {}
+                export_tt["timetable"][course_code]["sections"][sec][
+                    "schedule"
+                ] = course.sections[sec].schedule
+            export_tt["timetable"][course_code]["exams"] = course.exams
         export.append(export_tt)
         if len(export) == n_export:
             break
     json.dump(export, open("./files/my_timetables.json", "w"), indent=4)
 
 
+def count_passing(
+    iterable: Annotated[Iterable, "stage of the timetable pipeline"],
+    counts: Annotated[dict, "dictionary the count is stored in"],
+    key: Annotated[str, "key of the count in counts"],
+) -> Iterator:
+    """
+    Generator that passes on every item of a pipeline stage unchanged, while
+    counting how many items went through it
+
+    Args:
+        iterable (Iterable): stage of the timetable pipeline
+        counts (dict): dictionary the count is stored in
+        key (str): key of the count in counts
+    """
+    counts[key] = 0
+    for item in iterable:
+        counts[key] += 1
+        yield item
+
+
 def get_excluded_section_choices(sect_seperated_json):
     """
     function returns list of choices objects for every section of every course
@@ -600,8 +823,145 @@ def get_excluded_section_choices(sect_seperated_json):
     return section_exclude_choices
 
 
+def prefilter_sections(
+    sect_seperated_json: Annotated[
+        dict, "filtered json with courses seperated into sections"
+    ],
+    free_days: Annotated[list[str], "list of days which must be free"],
+    n_dels: Annotated[int, "number of DELs selected"],
+    n_opels: Annotated[int, "number of OPELs selected"],
+    n_huels: Annotated[int, "number of HUELs selected"],
+    index: CourseIndex,
+) -> Optional[dict]:
+    """
+    Function that removes every section and elective which cannot be part of a
+    timetable that has all the free days free (i.e, passes the strong filter of
+    sort_acc_to_heuristics), before any timetable is generated.
+
+    Sections of CDCs which have classes on a free day or clash with themselves
+    are removed. Electives are only ever taken with their first combination of
+    sections (see generate_course_domains), so an elective is removed as a whole
+    if that combination has classes on a free day or clashes with itself.
+
+    Args:
+        sect_seperated_json (dict): filtered json with courses seperated into sections
+        free_days (list[str]): list of days which must be free
+        n_dels (int): number of DELs selected
+        n_opels (int): number of OPELs selected
+        n_huels (int): number of HUELs selected
+        index (CourseIndex): compiled course index of the filtered json
+
+    Returns:
+        dict: the json without the removed sections and electives, None if fewer
+          electives of a kind are left than the number selected, i.e, no timetable
+          can have all the free days free
+    """
+    free_days = set(free_days)
+
+    def is_infeasible(course_code, sections):
+        if index.choice_mask(course_code, tuple(sections)) is None:
+            return True
+        return any(
+            day in free_days
+            for sec in sections
+            for day, _ in index.get_section(course_code, sec).day_hours
+        )
+
+    prefiltered = {}
+    for course_class, courses in sect_seperated_json.items():
+        prefiltered[course_class] = {}
+        for course_code, course_sections in courses.items():
+            if course_class == "CDCs":
+                prefiltered[course_class][course_code] = {
+                    section_type: [
+                        sec for sec in sections if not is_infeasible(course_code, [sec])
+                    ]
+                    for section_type, sections in course_sections.items()
+                }
+                continue
+
+            # in the same order as the section types in generate_intra_combinations
+            section_lists = [
+                course_sections[section_type]
+                for section_type in ["L", "P", "T"]
+                if section_type in course_sections
+            ]
+            if not all(section_lists) or is_infeasible(
+                course_code, [sections[0] for sections in section_lists]
+            ):
+                continue
+            prefiltered[course_class][course_code] = {
+                section_type: list(sections)
+                for section_type, sections in course_sections.items()
+            }
+
+    for course_class, n_selected in [
+        ("DEls", n_dels),
+        ("OPELs", n_opels),
+        ("HUELs", n_huels),
+    ]:
+        # generate_course_domains would leave out the kind of elective entirely
+        if (
+            len(prefiltered[course_class])
+            < n_selected
+            <= len(sect_seperated_json[course_class])
+        ):
+            return None
+
+    return prefiltered
+
+
 if __name__ == "__main__":
-    tt_json = json.load(open("./files/timetable.json", "r"))
+    # imported here as the search module itself builds on this one
+    from search import SEARCH_ENGINES
+
+    parser = argparse.ArgumentParser(
+        description="generate timetables without clashes, sorted by your preferences"
+    )
+    parser.add_argument(
+        "--engine",
+        choices=list(SEARCH_ENGINES.keys()),
+        default="exhaustive",
+        help="how timetables without clashes are searched for",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of processes to generate and filter timetables in "
+        "(more than one is only supported by the exhaustive engine)",
+    )
+    parser.add_argument(
+        "--strong",
+        action="store_true",
+        help="only keep timetables which have all the free days free, sections "
+        "which cannot be part of such a timetable are removed before searching",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=None,
+        help="only keep the given number of best timetables (keeps all by default)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="do not use (or update) the cache of results of earlier runs",
+    )
+    parser.add_argument(
+        "--count",
+        action="store_true",
+        help="only count the timetables without clashes, for every combination "
+        "of electives, without generating or ranking them",
+    )
+    args = parser.parse_args()
+    if args.workers > 1 and args.engine != "exhaustive":
+        parser.error("--workers is only supported by the exhaustive engine")
+    if args.top is not None and args.top < 1:
+        parser.error("--top must be at least 1")
+
+    # loaded from the compiled course database if it is up to date
+    tt_json, course_db, json_hash = load_timetable_json("./files/timetable.json")
 
     # has to be a list since dict_keys is not pickelable for prompt tools
     possible_courses = list(tt_json["courses"].keys())
@@ -617,6 +977,7 @@ if __name__ == "__main__":
     DEls, HUELs, OPELs = electives
     filtered_json = get_filtered_json(tt_json, CDC, DEls, HUELs, OPELs)
     sect_seperated_json = separate_sections_into_types(filtered_json)
+    course_index = CourseIndex(filtered_json, course_db)
 
     excluded_sections = AskUserInput.get_excluded_sections(
         get_excluded_section_choices(sect_seperated_json),
@@ -627,6 +988,35 @@ if __name__ == "__main__":
     for (course_class, course_name, section_type), section in excluded_sections:
         sect_seperated_json[course_class][course_name][section_type].remove(section)
 
+    if args.strong:
+        sect_seperated_json = prefilter_sections(
+            sect_seperated_json, free_days, nDels, nOpels, nHuels, course_index
+        )
+
+    if args.count:
+        # imported here as the search module itself builds on this one
+        from search import iter_timetable_counts
+
+        total_class_free = total_free = 0
+        if sect_seperated_json is not None:
+            for electives, n_class_free, n_free in iter_timetable_counts(
+                sect_seperated_json, filtered_json, nDels, nOpels, nHuels, course_index
+            ):
+                print(
+                    ", ".join(electives) or "(no electives)",
+                    "->",
+                    n_class_free,
+                    "without clashes (classes),",
+                    n_free,
+                    "without clashes (classes and exams)",
+                )
+                total_class_free += n_class_free
+                total_free += n_free
+
+        print("Number of timetables without clashes (classes):", total_class_free)
+        print("Number of timetables without clashes (classes and exams):", total_free)
+        sys.exit()
+
     exam_fit_strategy = AskUserInput.fuzzy_select(
         "How do you want your exam schedule to be",
         list(EXAM_FIT_STRATEGIES.keys()),
@@ -638,52 +1028,253 @@ if __name__ == "__main__":
         "should exams on same day be filtered?", default=False
     )
 
-    exhaustive_list_of_timetables = generate_exhaustive_timetables(
-        sect_seperated_json, nDels, nOpels, nHuels
-    )
-
-    timetables_without_clashes = remove_clashes(
-        exhaustive_list_of_timetables, filtered_json
-    )
-
-    print(
-        "Number of timetables without clashes (classes):",
-        len(timetables_without_clashes),
-    )
-
-    timetables_without_clashes = remove_exam_clashes(
-        timetables_without_clashes, filtered_json
-    )
-
-    print(
-        "Number of timetables without clashes (classes and exams):",
-        len(timetables_without_clashes),
-    )
+    result_cache = None if args.no_cache else ResultCache()
+    cached_result = None
+    cached_search = None
+    if result_cache is not None:
+        # the timetables without clashes only depend on the courses and sections,
+        # but the stages that are counted depend on the engine (and on whether
+        # the workers run the exhaustive pipeline), so they are cached separately
+        search_key = get_query_key(
+            "timetables without clashes",
+            json_hash.hex(),
+            CDC,
+            DEls,
+            HUELs,
+            OPELs,
+            [nDels, nOpels, nHuels],
+            sorted(excluded_sections),
+            sorted(free_days) if args.strong else None,
+            args.engine,
+            args.workers > 1,
+        )
+        rank_key = get_query_key(
+            "ranked timetables",
+            search_key,
+            free_days,
+            lite_order,
+            exam_fit_strategy,
+            filter_exams_on_same_day,
+            args.strong,
+            args.top,
+        )
+        cached_result = result_cache.get(rank_key)
+        if cached_result is None:
+            cached_search = result_cache.get(search_key)
+
+    stage_counts = {}
+    # when every timetable is ranked, they are kept in a session (which is then
+    # cached as well) and ranked on its columns. With --top only the best ones
+    # are ever held.
+    session = None
+    if cached_result is not None:
+        # the very same query was run before
+        n_ranked, best_timetables, lowest_match, stage_counts = cached_result
+    else:
+        if cached_search is not None:
+            # only the preferences changed, so the timetables without clashes
+            # found before are ranked again
+            session, stage_counts = cached_search
+        elif sect_seperated_json is None:
+            # too few electives can be taken with the free days free
+            in_my_preference_order = []
+        elif args.workers > 1:
+            # imported here as the parallel module itself builds on this one
+            from parallel import sort_acc_to_heuristics_parallel
+
+            in_my_preference_order = sort_acc_to_heuristics_parallel(
+                sect_seperated_json,
+                filtered_json,
+                nDels,
+                nOpels,
+                nHuels,
+                free_days,
+                lite_order,
+                exam_fit_strategy,
+                filter_exams_on_same_day,
+                filter=args.strong,
+                strong=args.strong,
+                workers=args.workers,
+                n_top=args.top,
+                stage_counts=stage_counts,
+            )
+        elif args.engine == "backtracking" and args.top is not None:
+            # imported here as the search module itself builds on this one
+            from search import sort_acc_to_heuristics_branch_and_bound
+
+            # only the best timetables are searched for, so the timetables without
+            # clashes are never all gone through (and counted)
+            in_my_preference_order = sort_acc_to_heuristics_branch_and_bound(
+                sect_seperated_json,
+                filtered_json,
+                nDels,
+                nOpels,
+                nHuels,
+                free_days,
+                lite_order,
+                exam_fit_strategy,
+                filter_exams_on_same_day,
+                filter=args.strong,
+                strong=args.strong,
+                n_top=args.top,
+                index=course_index,
+            )
+        elif args.engine == "backtracking":
+            # imported here as these modules themselves build on this one
+            from search import iter_counted_backtracking_timetables
+            from session import TimetableSession
+
+            # the number of classes on each day is worked out during the search
+            # itself, so the session does not go over the sections again
+            session = TimetableSession([], filtered_json, index=course_index)
+            for timetable, daily_counts in count_passing(
+                iter_counted_backtracking_timetables(
+                    sect_seperated_json,
+                    filtered_json,
+                    nDels,
+                    nOpels,
+                    nHuels,
+                    index=course_index,
+                ),
+                stage_counts,
+                "classes and exams",
+            ):
+                session.add(timetable, daily_counts)
+        else:
+            # every stage is a generator, so timetables flow through the pipeline
+            # one at a time and only the ranked survivors are ever held in memory
+            if args.engine == "exhaustive":
+                exhaustive_timetables = iter_exhaustive_timetables(
+                    sect_seperated_json, nDels, nOpels, nHuels
+                )
+
+                timetables_without_clashes = count_passing(
+                    iter_remove_clashes(
+                        exhaustive_timetables, filtered_json, course_index
+                    ),
+                    stage_counts,
+                    "classes",
+                )
+
+                timetables_without_clashes = iter_remove_exam_clashes(
+                    timetables_without_clashes, filtered_json, course_index
+                )
+            else:
+                engine_kwargs = {"index": course_index}
+                if args.engine == "constraint" and args.strong:
+                    # the free days are hard constraints with the strong filter, so
+                    # the constraint engine prunes them before it starts searching
+                    engine_kwargs["free_days"] = free_days
+
+                # the other engines prune class and exam clashes together
+                timetables_without_clashes = SEARCH_ENGINES[args.engine](
+                    sect_seperated_json,
+                    filtered_json,
+                    nDels,
+                    nOpels,
+                    nHuels,
+                    **engine_kwargs,
+                )
+
+            timetables_without_clashes = count_passing(
+                timetables_without_clashes,
+                stage_counts,
+                "classes and exams",
+            )
+
+            if args.top is not None:
+                in_my_preference_order = sort_acc_to_heuristics(
+                    timetables_without_clashes,
+                    filtered_json,
+                    free_days,
+                    lite_order,
+                    exam_fit_strategy,
+                    filter_exams_on_same_day,
+                    filter=args.strong,
+                    strong=args.strong,
+                    index=course_index,
+                    n_top=args.top,
+                )
+            else:
+                # imported here as the session module itself builds on this one
+                from session import TimetableSession
+
+                session = TimetableSession(
+                    timetables_without_clashes, filtered_json, index=course_index
+                )
+
+        # only what is printed and exported is kept of the ranking
+        if session is not None:
+            # the timetables are ranked on the columns of the session, and only
+            # the ones printed and exported are decoded
+            ranked_rows = session.rank_rows(
+                free_days,
+                lite_order,
+                exam_fit_strategy,
+                filter_exams_on_same_day,
+                filter=args.strong,
+                strong=args.strong,
+                n_top=args.top,
+            ).tolist()
+            n_ranked = len(ranked_rows)
+            best_timetables = session.get_decorated(
+                ranked_rows[:N_EXPORT],
+                free_days,
+                lite_order,
+                exam_fit_strategy,
+                filter_exams_on_same_day,
+            )
+            lowest_match = None
+            if ranked_rows:
+                (lowest_match,) = session.get_decorated(
+                    ranked_rows[-1:],
+                    free_days,
+                    lite_order,
+                    exam_fit_strategy,
+                    filter_exams_on_same_day,
+                )
+        else:
+            n_ranked = len(in_my_preference_order)
+            best_timetables = in_my_preference_order[:N_EXPORT]
+            lowest_match = (
+                in_my_preference_order[-1] if in_my_preference_order else None
+            )
+
+        if result_cache is not None:
+            result_cache.put(
+                rank_key, (n_ranked, best_timetables, lowest_match, stage_counts)
+            )
+            # a session holds every timetable without clashes (it is only used
+            # without --top), in the order they were found in, so it can be
+            # ranked again when only the preferences change
+            if cached_search is None and session is not None:
+                result_cache.put(search_key, (session, stage_counts))
+
+    if "classes" in stage_counts:
+        print(
+            "Number of timetables without clashes (classes):",
+            stage_counts["classes"],
+        )
 
-    in_my_preference_order = sort_acc_to_heuristics(
-        timetables_without_clashes,
-        filtered_json,
-        free_days,
-        lite_order,
-        exam_fit_strategy,
-        filter_exams_on_same_day,
-        filter=False,
-        strong=False,
-    )
+    if "classes and exams" in stage_counts:
+        print(
+            "Number of timetables without clashes (classes and exams):",
+            stage_counts["classes and exams"],
+        )
 
-    print("Number of timetables after filter: ", len(in_my_preference_order))
+    print("Number of timetables after filter: ", n_ranked)
 
-    if len(in_my_preference_order) > 0:
+    if n_ranked > 0:
         print(
             "-----------------------------------------------------",
             "\nHighest match:\n",
-            in_my_preference_order[0],
+            best_timetables[0],
             "\n\n",
             "-----------------------------------------------------",
             "\nLowest match:\n",
-            in_my_preference_order[-1],
+            lowest_match,
         )
     else:
         print("No timetables found")
 
-    export_to_json(in_my_preference_order, filtered_json)
+    export_to_json(best_timetables, filtered_json, index=course_index)
@@ -0,0 +1,384 @@
+import numpy as np
+from itertools import islice
+from math import prod
+from typing import Annotated, Iterable, Iterator, Optional
+from course_index import DAYS, CourseIndex
+from timetables import generate_course_domains, get_sort_order_mask
+
+# number of timetables checked together in one batch
+BATCH_SIZE = 100_000
+
+# a slot mask has 7 x 14 = 98 bits, so it is split into two 64 bit words
+WORD_MASK = (1 << 64) - 1
+
+
+def get_mask_words(
+    masks: Annotated[list, "slot masks of the choices of a course"]
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Function that converts the slot masks of the choices of a course into a
+    table which can be indexed by arrays of choice ids
+
+    Args:
+        masks (list): slot masks of the choices of a course (None if the choice
+          clashes with itself)
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: (n_choices, 2) uint64 array of mask words,
+          and a boolean array of which choices do not clash with themselves
+    """
+    words = np.zeros((len(masks), 2), dtype=np.uint64)
+    valid = np.zeros(len(masks), dtype=bool)
+    for i, mask in enumerate(masks):
+        if mask is not None:
+            words[i] = (mask & WORD_MASK, mask >> 64)
+            valid[i] = True
+    return words, valid
+
+
+def get_clash_free_rows(
+    choice_ids: Annotated[np.ndarray, "(n_timetables, n_courses) choice ids"],
+    tables: Annotated[list, "mask table of each course"],
+) -> np.ndarray:
+    """
+    Function that checks a whole batch of timetables for class clashes at once
+
+    Args:
+        choice_ids (np.ndarray): (n_timetables, n_courses) integer array, each row is a
+          timetable given by the index of the choice of every course
+        tables (list): (mask words, valid) table of each course, from get_mask_words
+
+    Returns:
+        np.ndarray: boolean array, True for timetables without class clashes
+    """
+    occupied = np.zeros((len(choice_ids), 2), dtype=np.uint64)
+    clash_free = np.ones(len(choice_ids), dtype=bool)
+    for position, (words, valid) in enumerate(tables):
+        ids = choice_ids[:, position]
+        masks = words[ids]
+        clash_free &= valid[ids]
+        clash_free &= ~(occupied & masks).any(axis=1)
+        occupied |= masks
+    return clash_free
+
+
+def get_exam_clash_free_rows(
+    exam_ids: Annotated[np.ndarray, "(n_timetables, n_courses) exam slot ids"],
+) -> np.ndarray:
+    """
+    Function that checks a whole batch of timetables for exam clashes at once
+
+    Args:
+        exam_ids (np.ndarray): (n_timetables, n_courses) integer array, each row
+          holds an id of the exam slot (midsem or compre) of every course
+
+    Returns:
+        np.ndarray: boolean array, True for timetables where no two courses share an exam slot
+    """
+    exam_ids = np.sort(exam_ids, axis=1)
+    return ~(exam_ids[:, 1:] == exam_ids[:, :-1]).any(axis=1)
+
+
+def iter_batches(iterable: Iterable, batch_size: int) -> Iterator[list]:
+    """
+    Generator that splits an iterable into lists of batch_size items
+    (the last list may be shorter)
+    """
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+
+def group_by_courses(batch: list) -> dict:
+    """
+    Function that groups the timetables of a batch by their courses,
+    since only timetables with the same courses can be stacked into one array
+
+    Returns:
+        dict: course codes of the timetables -> list of positions in the batch
+    """
+    groups = {}
+    for i, timetable in enumerate(batch):
+        course_codes = tuple(course_code for course_code, _ in timetable)
+        groups.setdefault(course_codes, []).append(i)
+    return groups
+
+
+def iter_remove_clashes_vectorized(
+    timetables: Annotated[Iterable, "exhaustive iterable of all possible timetables"],
+    json: Annotated[dict, "filtered json file"],
+    index: Optional[CourseIndex] = None,
+    batch_size: int = BATCH_SIZE,
+) -> Iterator[tuple]:
+    """
+    Vectorized version of iter_remove_clashes, which checks timetables in
+    batches using array operations. Gives the same timetables in the same order.
+
+    Args:
+        timetables (Iterable): exhaustive iterable of all possible timetables
+        json (dict): filtered json file
+        index (CourseIndex, optional): compiled course index of the filtered json
+        batch_size (int, optional): number of timetables checked at once
+
+    Yields:
+        tuple: timetable without clashes
+    """
+    if index is None:
+        index = CourseIndex(json)
+
+    # choice ids and mask tables of each course, grown as new choices are seen
+    choice_ids = {}
+    choice_masks = {}
+    for batch in iter_batches(timetables, batch_size):
+        keep = np.zeros(len(batch), dtype=bool)
+        for course_codes, rows in group_by_courses(batch).items():
+            ids = np.empty((len(rows), len(course_codes)), dtype=np.int64)
+            for r, row in enumerate(rows):
+                for position, choice in enumerate(batch[row]):
+                    course_code, sections_chosen = choice
+                    ids_of_course = choice_ids.setdefault(course_code, {})
+                    if sections_chosen not in ids_of_course:
+                        ids_of_course[sections_chosen] = len(ids_of_course)
+                        choice_masks.setdefault(course_code, []).append(
+                            index.choice_mask(course_code, sections_chosen)
+                        )
+                    ids[r, position] = ids_of_course[sections_chosen]
+            tables = [get_mask_words(choice_masks[code]) for code in course_codes]
+            keep[rows] = get_clash_free_rows(ids, tables)
+        for i in np.flatnonzero(keep):
+            yield batch[i]
+
+
+def iter_remove_exam_clashes_vectorized(
+    timetables: Annotated[
+        Iterable, "iterable of timetables without any clashes (classes)"
+    ],
+    json: Annotated[dict, "filtered json file"],
+    index: Optional[CourseIndex] = None,
+    batch_size: int = BATCH_SIZE,
+) -> Iterator[tuple]:
+    """
+    Vectorized version of iter_remove_exam_clashes, which checks timetables in
+    batches using array operations. Gives the same timetables in the same order.
+
+    Args:
+        timetables (Iterable): iterable of timetables without any clashes (classes)
+        json (dict): filtered json file
+        index (CourseIndex, optional): compiled course index of the filtered json
+        batch_size (int, optional): number of timetables checked at once
+
+    Yields:
+        tuple: timetable without any clashes (classes and exams)
+    """
+    if index is None:
+        index = CourseIndex(json)
+
+    # ids of every distinct midsem and compre time
+    exam_slot_ids = {}
+    for batch in iter_batches(timetables, batch_size):
+        keep = np.zeros(len(batch), dtype=bool)
+        for course_codes, rows in group_by_courses(batch).items():
+            mids, compres = zip(
+                *(
+                    index.get_course(course_code).exam_slots
+                    for course_code in course_codes
+                )
+            )
+            exam_ids = np.array(
+                [
+                    [
+                        exam_slot_ids.setdefault(time, len(exam_slot_ids))
+                        for time in mids
+                    ],
+                    [
+                        exam_slot_ids.setdefault(time, len(exam_slot_ids))
+                        for time in compres
+                    ],
+                ],
+                dtype=np.int64,
+            )
+            # the exams only depend on the courses, so all rows of the group share
+            # the result of checking the midsem row and the compre row once
+            keep[rows] = get_exam_clash_free_rows(exam_ids).all()
+        for i in np.flatnonzero(keep):
+            yield batch[i]
+
+
+def remove_clashes_vectorized(
+    timetables: Annotated[list, "exhaustive list of all possible timetables"],
+    json: Annotated[dict, "filtered json file"],
+    index: Optional[CourseIndex] = None,
+    batch_size: int = BATCH_SIZE,
+) -> list:
+    """
+    Vectorized version of remove_clashes
+
+    Args:
+        timetables (list): exhaustive list of all possible timetables
+        json (dict): filtered json file
+        index (CourseIndex, optional): compiled course index of the filtered json
+        batch_size (int, optional): number of timetables checked at once
+
+    Returns:
+        list: list of timetables without clashes
+    """
+    return list(iter_remove_clashes_vectorized(timetables, json, index, batch_size))
+
+
+def remove_exam_clashes_vectorized(
+    timetables: Annotated[list, "list of timetables without any clashes (classes)"],
+    json: Annotated[dict, "filtered json file"],
+    index: Optional[CourseIndex] = None,
+    batch_size: int = BATCH_SIZE,
+) -> list:
+    """
+    Vectorized version of remove_exam_clashes
+
+    Args:
+        timetables (list): list of timetables without any clashes (classes)
+        json (dict): filtered json file
+        index (CourseIndex, optional): compiled course index of the filtered json
+        batch_size (int, optional): number of timetables checked at once
+
+    Returns:
+        list: list of timetables without any clashes (classes and exams)
+    """
+    return list(
+        iter_remove_exam_clashes_vectorized(timetables, json, index, batch_size)
+    )
+
+
+def iter_vectorized_timetables(
+    sect_seperated_json: Annotated[
+        dict, "filtered json with courses seperated into sections"
+    ],
+    json: Annotated[dict, "filtered json file"],
+    n_dels: Annotated[int, "number of DELs selected"],
+    n_opels: Annotated[int, "number of OPELs selected"],
+    n_huels: Annotated[int, "number of HUELs selected"],
+    index: Optional[CourseIndex] = None,
+    batch_size: int = BATCH_SIZE,
+) -> Iterator[tuple]:
+    """
+    Generator that yields all timetables without clashes (classes and exams).
+    Candidates are generated directly as batches of choice id arrays, and only
+    the timetables without clashes are turned into tuples.
+
+    Args:
+        sect_seperated_json (dict): filtered json with courses seperated into sections
+        json (dict): filtered json file, i.e, with only courses selected
+        n_dels (int): number of DELs selected
+        n_opels (int): number of OPELs selected
+        n_huels (int): number of HUELs selected
+        index (CourseIndex, optional): compiled course index of the filtered json
+        batch_size (int, optional): number of timetables checked at once
+
+    Yields:
+        tuple: timetable without any clashes (classes and exams)
+    """
+    if index is None:
+        index = CourseIndex(json)
+
+    for courses in generate_course_domains(
+        sect_seperated_json, n_dels, n_opels, n_huels
+    ):
+        if not all(courses):
+            continue
+
+        # exams only depend on the courses, so the whole product shares them
+        mids, compres = zip(
+            *(index.get_course(domain[0][0]).exam_slots for domain in courses)
+        )
+        if len(set(mids)) != len(mids) or len(set(compres)) != len(compres):
+            continue
+
+        tables = [
+            get_mask_words([index.choice_mask(*choice) for choice in domain])
+            for domain in courses
+        ]
+        # row major order of the ids is the order of the cartesian product
+        n_choices = tuple(len(domain) for domain in courses)
+        n_timetables = prod(n_choices)
+        for start in range(0, n_timetables, batch_size):
+            flat_ids = np.arange(start, min(start + batch_size, n_timetables))
+            choice_ids = np.stack(np.unravel_index(flat_ids, n_choices), axis=1)
+            for row in choice_ids[get_clash_free_rows(choice_ids, tables)]:
+                yield tuple(domain[i] for domain, i in zip(courses, row))
+
+
+def rank_heuristic_columns(
+    day_counts: Annotated[np.ndarray, "(n_timetables, 7) classes on each day"],
+    exam_spreads: Annotated[np.ndarray, "exam spread microseconds of each timetable"],
+    exams_on_same_day: Annotated[
+        np.ndarray, "whether each timetable has exams on same day"
+    ],
+    free_days: Annotated[list[str], "list of days to be free if possible"],
+    lite_order: Annotated[
+        list[str],
+        "increasing order of how lite you want days to be (earlier means more lite)",
+    ],
+    exam_fit_strategy: Optional[str] = None,
+    filter_exams_on_same_day=False,
+    filter: Annotated[bool, "whether to filter or to just sort"] = False,
+    strong: Annotated[bool, "whether to use strong filter or not"] = False,
+    n_top: Annotated[Optional[int], "number of best timetables to keep"] = None,
+) -> np.ndarray:
+    """
+    Vectorized version of the scoring and ranking stages of sort_acc_to_heuristics.
+    Every heuristic is a column over all the timetables, and the timetables are
+    ranked by one stable lexsort of the columns multiplied by the sort order mask,
+    so they come out in the same order, ties included.
+
+    Args:
+        day_counts (np.ndarray): (n_timetables, 7) integer array of the number of
+          classes of each timetable on each day, in the order of DAYS
+        exam_spreads (np.ndarray): integer array of the exam spread of each
+          timetable in microseconds, as computed by ExamSpread.compute_spread
+        exams_on_same_day (np.ndarray): boolean array of whether each timetable
+          has two exams on the same day
+        free_days (list): list of days to be free if possible
+        lite_order (list): increasing order of how lite you want days to be (earlier means more lite)
+        exam_fit_strategy (str, optional): the strategy to use to sort exam spread seconds
+        filter_exams_on_same_day (bool): whether to reduce rank of timetables which have exams on same day
+        filter (bool, optional): whether to filter or to just sort. Defaults to False.
+        strong (bool, optional): whether to use strong filter or not. Defaults to False.
+        n_top (int, optional): if given, only the n_top best timetables are kept. Defaults to None.
+
+    Returns:
+        np.ndarray: positions of the timetables in ranked order, without the
+          filtered out ones
+    """
+    day_counts = day_counts.astype(np.int64).reshape(-1, len(DAYS))
+    n_free = np.zeros(len(day_counts), dtype=np.int64)
+    for day in free_days:
+        n_free += day_counts[:, DAYS.index(day)] == 0
+
+    does_match_free_days = n_free == len(free_days)
+    if not strong:
+        does_match_free_days |= n_free > 0
+
+    # the columns in the order of their priority, the daily scores in lite order
+    columns = [does_match_free_days.astype(np.int64)]
+    columns.extend(day_counts[:, DAYS.index(day)] for day in lite_order)
+    columns.append(n_free)
+    if filter_exams_on_same_day:
+        columns.append(exams_on_same_day.astype(np.int64))
+    if exam_fit_strategy is not None:
+        columns.append(exam_spreads.astype(np.int64))
+
+    # the multiplier of the daily scores acts on each of the days
+    sort_order_mask = get_sort_order_mask(exam_fit_strategy, filter_exams_on_same_day)
+    sort_order_mask[1:2] = sort_order_mask[1:2] * len(lite_order)
+    keys = [multiplier * column for multiplier, column in zip(sort_order_mask, columns)]
+
+    rows = np.arange(len(day_counts))
+    if filter:
+        rows = rows[does_match_free_days]
+        keys = [key[rows] for key in keys]
+
+    # lexsort is stable and sorts by the last key first
+    order = rows[np.lexsort(keys[::-1])]
+    if n_top is not None:
+        order = order[:n_top]
+
+    return order